@@ -7,23 +7,28 @@ DESCRIPTION = "A python library for medical image processing."
 URL = "https://github.com/kyle0x54/umtk"
 EMAIL = "kyle0x54@163.com"
 AUTHOR = "kyle0x54"
-REQUIRES_PYTHON = ">=3.6.0"
+REQUIRES_PYTHON = ">=3.7.0"
 VERSION = None
 
 
 REQUIRED = [
-    "cupy-cuda102",
     "Cython",
     "matplotlib",
     "nibabel",
     "numpy",
     "pycryptodome",
     "pydicom",
+    "scipy",
     "SimpleITK",
     "torch",
     "tqdm",
 ]
 
+# GPU arrays are optional, cupy is imported on first use
+EXTRAS = {
+    "gpu": ["cupy-cuda102"],
+}
+
 here = os.path.abspath(os.path.dirname(__file__))
 
 # Import the README and use it as the long description.
@@ -54,6 +59,7 @@ setup(
     url=URL,
     packages=find_packages(exclude=("tests",)),
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     include_package_data=True,
     license="APACHE",
     classifiers=[
@@ -63,7 +69,6 @@ setup(
         "Intended Audience :: Developers",
         "Topic :: Software Development :: Libraries :: Python Modules",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
     ],
     zip_safe=False,
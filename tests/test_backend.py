@@ -0,0 +1,65 @@
+import subprocess
+import sys
+import numpy as np
+import pytest
+import torch
+import umtk
+
+
+class FakeCupyArray:
+    """ Stands for a cupy array, only its type is used for dispatch."""
+    dtype = np.dtype(bool)
+
+
+FakeCupyArray.__module__ = "cupy._core.core"
+
+
+def test_import_without_cupy():
+    code = "import sys, umtk; assert 'cupy' not in sys.modules"
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_get_array_module():
+    assert umtk.get_array_module(np.zeros(3)) is np
+    assert not umtk.is_cupy_array(np.zeros(3))
+    assert umtk.is_cupy_array(FakeCupyArray())
+
+
+@pytest.mark.skipif(umtk.has_cupy(), reason="cupy is installed")
+def test_cupy_missing():
+    with pytest.raises(ImportError):
+        umtk.get_array_module(FakeCupyArray())
+    with pytest.raises(ImportError):
+        umtk.numpy2cupy(np.zeros(3))
+    # cupy arrays are dispatched to the gpu implementation
+    with pytest.raises(ImportError):
+        umtk.remove_small_objects(FakeCupyArray(), 10)
+
+
+def test_morphology_dispatch():
+    mask = np.zeros((5, 8, 8), dtype=bool)
+    mask[1:4, 1:5, 1:5] = True
+    mask[2, 7, 7] = True
+
+    expected = mask.copy()
+    expected[2, 7, 7] = False
+    dst = mask.copy()
+    umtk.remove_small_objects_gpu(dst, 2)
+    assert np.array_equal(dst, expected)
+
+    dst = mask.copy()
+    umtk.keep_largest_connected_component_gpu(dst)
+    assert np.array_equal(dst, expected)
+
+    dst = ~mask
+    umtk.remove_small_holes_gpu(dst, 2)
+    assert np.array_equal(dst, ~expected)
+
+
+def test_convert_dispatch():
+    arr = np.arange(6, dtype=np.float32)
+    assert umtk.cupy2numpy(arr) is arr
+
+    tensor = umtk.cupy2tensor_gpu(arr)
+    assert isinstance(tensor, torch.Tensor)
+    assert np.shares_memory(umtk.tensor2cupy_gpu(tensor), arr)
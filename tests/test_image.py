@@ -1,5 +1,9 @@
 import os
+import shutil
+import numpy as np
+import pydicom
 import pytest
+import SimpleITK
 import umtk
 
 
@@ -17,3 +21,646 @@ def gen_path(*paths):
 ])
 def test_isdicom(given, expected):
     assert umtk.isdicom(given) == expected
+
+
+BRAIN_PATHS = [
+    gen_path("dicoms", "brain", "brain_{:03d}.dcm".format(i))
+    for i in range(1, 21)
+]
+
+
+@pytest.mark.parametrize("num_workers", [0, 4])
+def test_read_dicoms_num_workers(num_workers):
+    vtd = umtk.read_dicoms(
+        list(reversed(BRAIN_PATHS)),
+        allow_missing_layers=True,
+        num_workers=num_workers
+    )
+    assert vtd["sorted_paths"] == BRAIN_PATHS
+    assert vtd["instances"] == list(range(1, 21))
+    assert vtd["image_zyx"].shape == (20, 256, 256)
+
+
+def test_read_dicoms_header_error_path():
+    paths = BRAIN_PATHS[:5] + [gen_path("missing_1.dcm")] + BRAIN_PATHS[5:]
+    paths.append(gen_path("missing_2.dcm"))
+    with pytest.raises(umtk.ReadDicomHeaderError, match="missing_1"):
+        umtk.read_dicoms(paths, allow_missing_layers=True, num_workers=4)
+
+
+def test_read_dicoms_fast_header():
+    vtd = umtk.read_dicoms(BRAIN_PATHS, allow_missing_layers=True)
+    vtd_fast = umtk.read_dicoms(
+        BRAIN_PATHS, allow_missing_layers=True, fast_header=True
+    )
+    for key in ("series_id", "instances", "sorted_paths"):
+        assert vtd_fast[key] == vtd[key]
+    for key in ("spacing_zyx", "direction_zyx", "origin_zyx", "image_zyx"):
+        assert (vtd_fast[key] == vtd[key]).all()
+
+
+def test_read_dicoms_pydicom_backend():
+    vtd = umtk.read_dicoms(BRAIN_PATHS, allow_missing_layers=True)
+    vtd_pydicom = umtk.read_dicoms(
+        BRAIN_PATHS, allow_missing_layers=True, backend="pydicom"
+    )
+    assert list(vtd_pydicom.keys()) == list(vtd.keys())
+    assert not vtd_pydicom.is_loaded("image_itk")
+    assert vtd_pydicom["image_zyx"].dtype == vtd["image_zyx"].dtype
+    assert (vtd_pydicom["image_zyx"] == vtd["image_zyx"]).all()
+    image_itk = vtd_pydicom["image_itk"]
+    assert image_itk.GetSize() == vtd["image_itk"].GetSize()
+    assert image_itk.GetOrigin() == vtd["image_itk"].GetOrigin()
+
+    # update() replaces a value which has not been loaded yet
+    vtd_pydicom = umtk.read_dicoms(
+        BRAIN_PATHS, allow_missing_layers=True, backend="pydicom"
+    )
+    vtd_pydicom.update({"image_itk": None})
+    assert vtd_pydicom.is_loaded("image_itk")
+    assert dict(vtd_pydicom.items())["image_itk"] is None
+
+
+def test_read_dicoms_pydicom_backend_unsigned(tmp_path):
+    paths = []
+    for path in BRAIN_PATHS:
+        ds = pydicom.dcmread(path)
+        ds.PixelRepresentation = 0
+        paths.append(str(tmp_path / os.path.basename(path)))
+        ds.save_as(paths[-1])
+
+    vtd = umtk.read_dicoms(paths, allow_missing_layers=True)
+    vtd_pydicom = umtk.read_dicoms(
+        paths, allow_missing_layers=True, backend="pydicom"
+    )
+    assert vtd["image_zyx"].dtype == np.uint16
+    assert vtd_pydicom["image_zyx"].dtype == np.uint16
+    assert (vtd_pydicom["image_zyx"] == vtd["image_zyx"]).all()
+
+
+def test_read_dicoms_index(tmp_path):
+    series_dir = tmp_path / "series"
+    series_dir.mkdir()
+    for path in BRAIN_PATHS:
+        shutil.copy(path, str(series_dir))
+    index_path = str(tmp_path / "index.sqlite")
+
+    vtd = umtk.read_dicoms(str(series_dir), allow_missing_layers=True)
+    for _ in range(2):
+        vtd_index = umtk.read_dicoms(
+            str(series_dir), allow_missing_layers=True, index=index_path
+        )
+        assert vtd_index["sorted_paths"] == vtd["sorted_paths"]
+        assert (vtd_index["spacing_zyx"] == vtd["spacing_zyx"]).all()
+        assert (vtd_index["image_zyx"] == vtd["image_zyx"]).all()
+
+    path = vtd["sorted_paths"][0]
+    with umtk.DicomIndex(index_path) as index:
+        headers = index.read_headers([path], lambda paths: pytest.fail())
+        assert headers[0].InstanceNumber == 1
+
+        # a modified file must be parsed again
+        ds = pydicom.dcmread(path)
+        ds.InstanceNumber = 100
+        ds.save_as(path)
+        headers = index.read_headers(
+            [path], lambda paths: [pydicom.dcmread(p) for p in paths]
+        )
+        assert headers[0].InstanceNumber == 100
+
+
+def test_scan_series(tmp_path):
+    for i, name in enumerate(["a", "b/c"]):
+        series_dir = tmp_path / name
+        series_dir.mkdir(parents=True)
+        for path in BRAIN_PATHS:
+            ds = pydicom.dcmread(path)
+            ds.SeriesInstanceUID = "1.2.{}".format(i)
+            ds.save_as(str(series_dir / os.path.basename(path)))
+    shutil.copy(gen_path("texts", "empty.txt"), str(tmp_path / "b"))
+
+    series_list = list(umtk.scan_series(str(tmp_path), num_workers=4))
+    assert [s.series_id for s in series_list] == ["1.2.0", "1.2.1"]
+    vtd = umtk.read_dicoms(BRAIN_PATHS, allow_missing_layers=True)
+    for series in series_list:
+        assert series.error is None
+        assert (series.spacing_zyx == vtd["spacing_zyx"]).all()
+        vtd_series = series.load(allow_missing_layers=True)
+        assert vtd_series["series_id"] == series.series_id
+        assert vtd_series["sorted_paths"] == series.sorted_paths
+        assert (vtd_series["image_zyx"] == vtd["image_zyx"]).all()
+
+
+def test_iter_slabs(tmp_path):
+    vtd = umtk.read_dicoms(BRAIN_PATHS, allow_missing_layers=True)
+    slabs = umtk.iter_dicom_slabs(
+        BRAIN_PATHS, slab_size=8, allow_missing_layers=True
+    )
+    starts, slabs = zip(*slabs)
+    assert starts == (0, 8, 16)
+    assert [len(slab) for slab in slabs] == [8, 8, 4]
+    assert (np.concatenate(slabs) == vtd["image_zyx"]).all()
+
+    with pytest.raises(umtk.NotEnoughSlicesError):
+        umtk.iter_dicom_slabs(
+            BRAIN_PATHS, min_num_slices=21, allow_missing_layers=True
+        )
+
+    path = str(tmp_path / "brain.mha")
+    SimpleITK.WriteImage(vtd["image_itk"], path)
+    slabs = [slab for _, slab in umtk.iter_itk_slabs(path, slab_size=6)]
+    assert [len(slab) for slab in slabs] == [6, 6, 6, 2]
+    assert (np.concatenate(slabs) == vtd["image_zyx"]).all()
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_iter_volumes(tmp_path, ordered):
+    vtd = umtk.read_dicoms(BRAIN_PATHS, allow_missing_layers=True)
+    path = str(tmp_path / "brain.mha")
+    SimpleITK.WriteImage(vtd["image_itk"], path)
+    sources = [path, gen_path("missing.mha"), BRAIN_PATHS, path]
+
+    results = list(umtk.iter_volumes(
+        sources, num_workers=2, prefetch=2, ordered=ordered
+    ))
+    assert len(results) == len(sources)
+    if ordered:
+        assert [source for source, _ in results] == sources
+    results = {id(source): result for source, result in results}
+    assert (results[id(path)]["image_zyx"] == vtd["image_zyx"]).all()
+    error = results[id(sources[1])]
+    assert isinstance(error, umtk.ReadDicomDataError)
+    assert error.error_code.value == "102"
+    assert isinstance(
+        results[id(BRAIN_PATHS)], umtk.InconsistentZPixelSpacingError
+    )
+
+    # a read is only started once a result is consumed
+    started = []
+    for i, _ in enumerate(umtk.iter_volumes(
+        range(10), reader=started.append, prefetch=3, ordered=ordered
+    )):
+        assert len(started) <= 3 + i
+
+
+def test_read_itk_zero_copy(tmp_path):
+    vtd = umtk.read_dicoms(BRAIN_PATHS, allow_missing_layers=True)
+    path = str(tmp_path / "brain.mha")
+    SimpleITK.WriteImage(vtd["image_itk"], path)
+
+    vtd_view = umtk.read_itk(path, zero_copy=True, keep_itk=False)
+    assert vtd_view["image_itk"] is None
+    assert (vtd_view["image_zyx"] == vtd["image_zyx"]).all()
+    vtd_view["image_zyx"][0, 0, 0] = 1000
+    assert vtd_view["image_zyx"][0, 0, 0] == 1000
+
+    vtd_info = umtk.read_itk(path, load_image=False)
+    assert "image_zyx" not in vtd_info
+    assert vtd_info["shape_zyx"] == vtd["image_zyx"].shape
+    assert (vtd_info["spacing_zyx"] == vtd_view["spacing_zyx"]).all()
+
+    vtd_info = umtk.read_dicoms(
+        BRAIN_PATHS, allow_missing_layers=True, load_image=False
+    )
+    assert "image_zyx" not in vtd_info
+    assert vtd_info["shape_zyx"] == vtd["image_zyx"].shape
+
+
+def test_volume_cache(tmp_path):
+    vtd = umtk.read_dicoms(BRAIN_PATHS, allow_missing_layers=True)
+    vtd["annotations"] = {"boxes": np.ones((3, 6)), "label": "tumor"}
+    umtk.write_volume_cache(str(tmp_path / "cache"), vtd)
+
+    vtd_cache = umtk.read_volume_cache(str(tmp_path / "cache"))
+    assert list(vtd_cache.keys()) == list(vtd.keys())
+    assert vtd_cache["image_itk"] is None
+    assert isinstance(vtd_cache["image_zyx"], np.memmap)
+    assert (vtd_cache["image_zyx"] == vtd["image_zyx"]).all()
+    assert (vtd_cache["spacing_zyx"] == vtd["spacing_zyx"]).all()
+    assert vtd_cache["sorted_paths"] == vtd["sorted_paths"]
+    assert vtd_cache["annotations"]["label"] == "tumor"
+    assert (vtd_cache["annotations"]["boxes"] == 1).all()
+
+    # a cache is replaced as a whole, keys are not used as paths as is
+    umtk.write_volume_cache(
+        str(tmp_path / "cache"), {"../x": np.zeros(2), "a/b": {"c": 1}}
+    )
+    vtd_cache = umtk.read_volume_cache(str(tmp_path / "cache"))
+    assert list(vtd_cache.keys()) == ["../x", "a/b"]
+    assert vtd_cache["a/b"] == {"c": 1}
+    assert sorted(os.listdir(str(tmp_path))) == ["cache"]
+    assert len(os.listdir(str(tmp_path / "cache"))) == 3
+
+    vtd = umtk.read_dicoms(
+        BRAIN_PATHS, allow_missing_layers=True, backend="pydicom"
+    )
+    umtk.write_volume_cache(str(tmp_path / "cache"), vtd)
+    assert not vtd.is_loaded("image_itk")
+
+
+def test_read_h5_lazy(tmp_path):
+    image = np.arange(4 * 5 * 6, dtype=np.int16).reshape(4, 5, 6)
+    data = {
+        "series_id": "1.2.3",
+        "image_zyx": image,
+        "spacing_zyx": np.array([1.0, 0.5, 0.5]),
+        "annotations": {"num_boxes": 3},
+    }
+    path = str(tmp_path / "volume.h5")
+    umtk.write_h5(path, data)
+
+    vtd = umtk.read_h5(path)
+    assert vtd["series_id"] == "1.2.3"
+    assert (vtd["image_zyx"] == image).all()
+    assert vtd["annotations"]["num_boxes"] == 3
+
+    with umtk.read_h5(path, lazy=True) as vtd:
+        assert set(vtd) == set(data)
+        assert vtd["series_id"] == "1.2.3"
+        assert vtd["annotations"]["num_boxes"] == 3
+        assert (vtd["image_zyx"][1:3] == image[1:3]).all()
+        assert (vtd["spacing_zyx"][:] == data["spacing_zyx"]).all()
+    with pytest.raises(Exception):
+        vtd["image_zyx"]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"chunks": "slice", "num_workers": 4},
+    {"chunks": (3, 7, 11), "compression": "gzip:1", "num_workers": 2},
+    {"chunks": "patch", "compression": {"image_zyx": "lzf"}},
+])
+def test_write_h5_options(tmp_path, kwargs):
+    image = np.random.RandomState(0).randint(-1024, 3000, (10, 30, 40))
+    data = {"image_zyx": image.astype(np.int16), "spacing_zyx": np.ones(3)}
+    path = str(tmp_path / "volume.h5")
+    umtk.write_h5(path, data, **kwargs)
+
+    vtd = umtk.read_h5(path)
+    assert (vtd["image_zyx"] == data["image_zyx"]).all()
+    with umtk.read_h5(path, lazy=True) as vtd:
+        assert vtd["image_zyx"].compression is not None
+        assert vtd["spacing_zyx"].compression is None
+
+    # scalars are stored without chunks / compression
+    umtk.write_h5(path, {"x": np.array(3.0)}, **kwargs)
+    assert umtk.read_h5(path)["x"] == 3.0
+
+
+def test_write_h5_ragged(tmp_path):
+    rng = np.random.RandomState(0)
+    boxes = [rng.rand(rng.randint(0, 5), 4) for _ in range(100)]
+    boxes[0] = np.zeros((2, 4))
+    contours = [[[0, 0], [0, 5], [5, 5]], [[1, 1], [2, 2]]]
+    path = str(tmp_path / "volume.h5")
+
+    umtk.write_h5(path, {"boxes": boxes, "annotations": {"c": contours}})
+    vtd = umtk.read_h5(path)
+    assert len(vtd["boxes"]) == len(boxes)
+    for box, box_h5 in zip(boxes, vtd["boxes"]):
+        assert box_h5.shape == box.shape
+        assert (box_h5 == box).all()
+    assert [c.tolist() for c in vtd["annotations"]["c"]] == contours
+
+    umtk.write_h5(path, {"annotations": {"c": contours}}, ragged="pad")
+    padded = umtk.read_h5(path)["annotations"]["c"]
+    assert padded.shape == (2, 3, 2)
+    assert (padded[0] == contours[0]).all()
+    assert np.isnan(padded[1, 2]).all()
+
+
+def test_normalize_out_and_threads():
+    src = np.random.RandomState(0).randint(-1024, 3000, (9, 16, 16))
+    src = src.astype(np.int16)
+    src_float = src.astype(np.float32)
+
+    expected = (src_float.clip(-100, 400) + 100) / 500
+    dst = umtk.normalize_fixed(src, -100, 400, num_threads=4)
+    assert np.allclose(dst, expected)
+    assert umtk.normalize_fixed(src_float, -100, 400, out=src_float) \
+        is src_float
+    assert np.allclose(src_float, expected)
+
+    expected = (src - 100.) / 50.
+    assert np.allclose(
+        umtk.normalize_mean_std(src, 100., 50., num_threads=3), expected
+    )
+    expected = (src - src.min()) / float(src.max() - src.min())
+    out = np.empty(src.shape, dtype=np.float32)
+    assert umtk.normalize_adaptive(src, out=out, num_threads=None) is out
+    assert np.allclose(out, expected)
+
+    # 0-d images have no slabs
+    src = np.array(150, dtype=np.int16)
+    assert umtk.normalize_fixed(src, -100, 400, num_threads=4) == 0.5
+    assert umtk.normalize_mean_std(src, 100., 50.) == 1.
+    assert umtk.normalize_adaptive(src) == 0.
+    assert umtk.imadjust(src, method="histogram").shape == ()
+
+
+def test_imadjust_histogram():
+    rs = np.random.RandomState(0)
+    src = rs.randint(-1024, 3000, (9, 16, 16)).astype(np.int16)
+    q = [0, 1, 37.5, 50, 99, 100]
+    assert np.allclose(umtk.fast_percentile(src, q), np.percentile(src, q))
+
+    expected = umtk.imadjust(src)
+    dst = umtk.imadjust(src, method="histogram", num_threads=4)
+    assert dst.dtype == np.float32
+    assert np.allclose(dst, expected)
+
+    src = rs.normal(size=(9, 16, 16)).astype(np.float32)
+    low, high = umtk.fast_percentile(src, (1, 99), max_samples=500)
+    assert src.min() <= low < high <= src.max()
+
+
+def test_intensity_lut():
+    from functools import partial
+
+    src = np.random.RandomState(0).randint(-1024, 3000, (9, 16, 16))
+    src = src.astype(np.int16)
+    funcs = [
+        partial(umtk.normalize_fixed, in_min=-100, in_max=400),
+        partial(umtk.gamma_transform, gamma=0.5),
+    ]
+    expected = funcs[1](funcs[0](src))
+
+    lut = umtk.IntensityLUT(funcs[:1])
+    out = np.empty(src.shape, dtype=np.float32)
+    assert lut.then(funcs[1])(src, out=out, num_threads=4) is out
+    assert np.allclose(out, expected)
+    assert np.allclose(umtk.IntensityLUT(funcs)(src), expected)
+
+    lut = umtk.IntensityLUT(
+        [umtk.get_imadjust_transform(src, 2, 98)], dtype=np.int16
+    )
+    assert np.allclose(lut(src), umtk.imadjust(src, 2, 98))
+
+    src = src.astype(np.uint16)
+    assert np.array_equal(
+        umtk.IntensityLUT([lambda x: x // 2], np.uint16)(src), src // 2
+    )
+
+
+def test_pipeline():
+    from umtk.image.utils import get_reorient_image
+
+    src = np.random.RandomState(0).randint(-1024, 3000, (32, 64, 64))
+    src = src.astype(np.int16)
+    vtd = {"image_zyx": src, "direction_zyx": np.array([-1., 1., -1.])}
+
+    def naive(vtd):
+        img = get_reorient_image(vtd)
+        img = umtk.center_crop(img, (16, 32, 32))
+        img = umtk.resize(img, (8, 16, 16), mode="nearest")
+        img = umtk.gamma_transform(umtk.normalize_fixed(img, -100, 400), 0.5)
+        return umtk.crop(img, (2, 4, 4), (4, 8, 8))
+
+    pipeline = (
+        umtk.Pipeline()
+        .reorient()
+        .center_crop((16, 32, 32))
+        .resize((8, 16, 16), mode="nearest")
+        .normalize_fixed(-100, 400)
+        .gamma_transform(0.5)
+        .crop((2, 4, 4), (4, 8, 8))
+    )
+    # the final crop is moved ahead of the resize and the intensity ops
+    assert pipeline.plan(src.shape, src.dtype, vtd["direction_zyx"]) == [
+        "view", "resize", "normalize_fixed+gamma_transform"
+    ]
+    dst = pipeline(vtd)
+    assert dst.flags.c_contiguous
+    assert np.allclose(dst, naive(vtd))
+
+    dsts = pipeline.run_batch([vtd, vtd], num_workers=2)
+    assert dsts[0] is not dsts[1]
+    assert np.allclose(dsts[1], dst)
+    assert set(pipeline.timings) == {
+        "view", "resize", "normalize_fixed+gamma_transform"
+    }
+
+    # one buffer per slot of a plan, whatever the number of plans
+    num_buffers = len(pipeline._local.buffers)
+    for dtype in (np.int32, np.float32):
+        pipeline(dict(vtd, image_zyx=src.astype(dtype)))
+    assert len(pipeline._local.buffers) == num_buffers
+
+    src = src.astype(np.float32)
+    dst = umtk.Pipeline().flip((0, 2)).normalize_fixed(-100, 400)(src)
+    expected = umtk.normalize_fixed(src[::-1, :, ::-1], -100, 400)
+    assert np.allclose(dst, expected)
+
+    # a contiguous view of the input is copied as well
+    dst = umtk.Pipeline().crop((1, 0, 0), (2, 64, 64))(src)
+    assert not np.shares_memory(dst, src)
+    assert np.array_equal(dst, src[1:3])
+
+
+def test_resize_options(monkeypatch):
+    src = np.random.RandomState(0).randint(0, 5, (9, 16, 20)).astype(np.uint8)
+
+    # nearest resize gathers voxels, the same as (float) torch
+    expected = umtk.resize(src.astype(np.float32), (5, 32, 7), mode="nearest")
+    dst = umtk.resize(src, (5, 32, 7), mode="nearest", num_threads=2)
+    assert dst.dtype == np.uint8
+    assert np.array_equal(dst, expected)
+
+    # gathered a few planes / a plane at a time
+    from umtk.image import geometry
+    for chunk_size in (100, 500):
+        monkeypatch.setattr(geometry, "_GATHER_CHUNK_SIZE", chunk_size)
+        out = np.empty((5, 32, 7), dtype=np.uint8)
+        umtk.resize(src, (5, 32, 7), mode="nearest", out=out)
+        assert np.array_equal(out, expected)
+        dst = umtk.resize_batch([src, src], (5, 32, 7), mode="nearest")
+        assert np.array_equal(dst[1], expected)
+    monkeypatch.undo()
+
+    out = np.empty((18, 8, 10), dtype=np.float32)
+    expected = umtk.resize(src, (18, 8, 10), to_float=True)
+    assert umtk.resize(
+        src, (18, 8, 10), to_float=True, out=out, num_threads=1
+    ) is out
+    assert np.allclose(out, expected)
+
+    assert umtk.get_spacing_size(src.shape, (2.5, 0.7, 0.7), (1, 1, 1)) \
+        == (22, 11, 14)
+    dst = umtk.resize_to_spacing(
+        src, (2.5, 0.7, 0.7), (1, 1, 1), mode="nearest"
+    )
+    assert dst.shape == (22, 11, 14)
+
+
+def test_resize_batch():
+    srcs = np.random.RandomState(0).randint(0, 100, (5, 4, 6, 8))
+    srcs = srcs.astype(np.int16)
+
+    for mode in ("nearest", "trilinear"):
+        expected = np.stack([umtk.resize(src, (8, 3, 5), mode=mode)
+                             for src in srcs])
+        dst = umtk.resize_batch(list(srcs), (8, 3, 5), mode=mode)
+        assert dst.dtype == np.int16
+        assert np.array_equal(dst, expected)
+
+    out = np.empty((5, 8, 3, 5), dtype=np.float32)
+    assert umtk.resize_batch(srcs, (8, 3, 5), to_float=True, out=out) is out
+    assert np.allclose(out[2], umtk.resize(srcs[2], (8, 3, 5), True))
+
+
+def test_resample_to_spacing():
+    src = np.random.RandomState(0).normal(0, 100, (10, 24, 24))
+    vtd = {
+        "series_id": "test",
+        "image_zyx": src.astype(np.float32),
+        "spacing_zyx": np.array([2.5, 0.7, 0.7]),
+        "origin_zyx": np.array([10., -20., 30.]),
+        "direction_zyx": np.array([1, 1, -1]),
+    }
+
+    dst = umtk.resample_to_spacing(vtd, (1., 1., 1.), num_threads=3)
+    assert dst["series_id"] == "test"
+    assert dst["image_zyx"].shape == (25, 17, 17)
+    assert np.allclose(
+        dst["spacing_zyx"], [1., 0.7 * 24 / 17, 0.7 * 24 / 17]
+    )
+    # the first voxel center moves by half of the spacing change
+    assert np.allclose(
+        dst["origin_zyx"],
+        [10. - 0.75, -20. + (0.7 * 24 / 17 - 0.7) / 2,
+         30. - (0.7 * 24 / 17 - 0.7) / 2]
+    )
+    assert np.allclose(
+        dst["image_zyx"], umtk.resize(vtd["image_zyx"], (25, 17, 17)),
+        atol=1e-3
+    )
+
+    # same as a linear resampling by SimpleITK onto the new grid, except
+    # the boundary slices which are extrapolated by SimpleITK
+    image = SimpleITK.GetImageFromArray(vtd["image_zyx"])
+    image.SetSpacing(vtd["spacing_zyx"][::-1].tolist())
+    image.SetOrigin(vtd["origin_zyx"][::-1].tolist())
+    image.SetDirection(np.diag(vtd["direction_zyx"][::-1]).ravel().tolist())
+    expected = SimpleITK.GetArrayFromImage(SimpleITK.Resample(
+        image, dst["image_zyx"].shape[::-1], SimpleITK.Transform(),
+        SimpleITK.sitkLinear, dst["origin_zyx"][::-1].tolist(),
+        dst["spacing_zyx"][::-1].tolist(), image.GetDirection()
+    ))
+    assert np.allclose(
+        dst["image_zyx"][1:-1], expected[1:-1], atol=0.05
+    )
+
+    vtd["image_zyx"] = (vtd["image_zyx"] > 0).astype(np.uint8)
+    dsts = umtk.resample_batch(
+        [vtd, vtd], (1., 1., 1.), mode="nearest", num_workers=2
+    )
+    assert np.array_equal(
+        dsts[1]["image_zyx"],
+        umtk.resize(vtd["image_zyx"], (25, 17, 17), mode="nearest")
+    )
+
+
+def test_flip_and_reorient():
+    src = np.arange(24).reshape((2, 3, 4))
+
+    view = umtk.zflip(src, copy=False)
+    assert np.shares_memory(view, src)
+    assert not np.shares_memory(umtk.xflip(src), src)
+    assert np.array_equal(umtk.flip(src, (0, 2)), src[::-1, :, ::-1])
+    assert umtk.flip(src, (1,), copy=True).flags.c_contiguous
+
+    expected = np.transpose(src[:, ::-1, ::-1], (2, 0, 1))
+    view = umtk.reorient(src, np.array([1, -1, -1]), axes=(2, 0, 1))
+    assert np.shares_memory(view, src)
+    assert np.array_equal(view, expected)
+    dst = umtk.reorient(src, np.array([1, -1, -1]), (2, 0, 1), copy=True)
+    assert dst.flags.c_contiguous
+    assert np.array_equal(dst, expected)
+
+
+def test_patches():
+    src = np.random.RandomState(0).normal(size=(10, 12, 7))
+    src = src.astype(np.float32)
+
+    starts = umtk.get_patch_starts(src.shape, (4, 8, 8), (3, 4, 4))
+    assert sorted(set(starts[:, 0])) == [0, 3, 6]
+    assert sorted(set(starts[:, 1])) == [0, 4]
+    assert sorted(set(starts[:, 2])) == [0]
+    patches = umtk.extract_patches(src, starts, (4, 8, 8), pad_value=-1)
+    assert patches.shape == (6, 4, 8, 8)
+    assert np.array_equal(patches[1, :, :, :7], src[0:4, 4:12])
+    assert np.all(patches[1, :, :, 7:] == -1)
+
+    stitcher = umtk.PatchStitcher(src.shape)
+    stitcher.add(patches[:3], starts[:3])
+    stitcher.add(patches[3:], starts[3:])
+    assert np.allclose(stitcher.result(), src)
+
+    windows, window_starts = umtk.get_sliding_windows(
+        src, (4, 4, 7), (2, 4, 1)
+    )
+    assert windows.shape == (4, 3, 1, 4, 4, 7)
+    assert np.shares_memory(windows, src)
+    assert np.array_equal(windows[3, 2, 0], src[6:10, 8:12])
+    assert tuple(window_starts[3, 2, 0]) == (6, 8, 0)
+
+    windows, _ = umtk.get_sliding_windows(src, (4, 8, 8), (4, 8, 8))
+    assert windows.shape == (3, 2, 1, 4, 8, 8)
+    assert np.all(windows[2, 1, 0, 2:] == 0)
+
+
+def test_crop_to_foreground():
+    src = np.full((10, 12, 14), -1000, dtype=np.int16)
+    src[3:5, 4:9, 1:2] = 40
+    src[6, 5, 7] = 100
+
+    dst, start, size = umtk.crop_to_foreground(src, threshold=-500)
+    assert start == (3, 4, 1) and size == (4, 5, 7)
+    assert np.shares_memory(dst, src)
+    assert np.array_equal(dst, umtk.crop(src, start, size))
+
+    mask = src > 50
+    _, start, size = umtk.crop_to_foreground(
+        src, mask=mask, margin=(1, 2, 10), num_threads=3
+    )
+    assert start == (5, 3, 0) and size == (3, 5, 14)
+
+    dst, start, size = umtk.crop_to_foreground(src, threshold=500)
+    assert dst is src and start == (0, 0, 0) and size == src.shape
+
+    # deeper than a slab, foreground split across slabs
+    src = np.zeros((40, 6, 6), dtype=np.uint8)
+    src[10, 1, 2] = src[35, 4, 3] = 1
+    for num_threads in (1, 3):
+        _, start, size = umtk.crop_to_foreground(
+            src, threshold=0, num_threads=num_threads
+        )
+        assert start == (10, 1, 2) and size == (26, 4, 2)
+
+
+def test_morphology():
+    from scipy import ndimage
+
+    src = np.random.RandomState(0).rand(30, 20, 20)
+    mask = ndimage.gaussian_filter(src, 1.2) > 0.52
+    labels, _ = ndimage.label(mask)
+    sizes = np.bincount(labels.ravel())
+
+    for num_threads in (1, 4):
+        dst = mask.copy()
+        umtk.remove_small_objects(dst, 20, num_threads=num_threads)
+        assert np.array_equal(dst, mask & (sizes >= 20)[labels])
+
+        dst = mask.copy()
+        umtk.keep_largest_connected_component(dst, num_threads=num_threads)
+        assert np.array_equal(dst, labels == np.argmax(sizes[1:]) + 1)
+
+        dst = ~mask
+        umtk.remove_small_holes(dst, 20, num_threads=num_threads)
+        assert np.array_equal(dst, ~(mask & (sizes >= 20)[labels]))
+
+    dst = labels.copy()
+    umtk.remove_small_objects(dst, 20, num_threads=3)
+    assert np.array_equal(dst, labels * (sizes >= 20)[labels])
+
+    with pytest.raises(TypeError):
+        umtk.remove_small_objects(src, 20)
@@ -0,0 +1,67 @@
+import subprocess
+import sys
+import time
+import umtk
+
+
+HEAVY_MODULES = [
+    "torch", "SimpleITK", "pydicom", "h5py", "cupy", "nibabel", "Crypto",
+    "tqdm", "scipy",
+]
+
+
+def _run(code):
+    tic = time.perf_counter()
+    output = subprocess.check_output([sys.executable, "-c", code])
+    return time.perf_counter() - tic, output.decode().split()
+
+
+def _get_loaded(code):
+    code += "\nprint(' '.join(m for m in {} if m in sys.modules))\n".format(
+        HEAVY_MODULES)
+    return _run("import sys, umtk\n" + code)[1]
+
+
+def test_lazy_import():
+    assert _get_loaded("umtk.isdicom, umtk.compute_md5_str") == []
+    # heavy modules are only imported by the names which need them
+    loaded = _get_loaded("umtk.read_dicoms")
+    assert "SimpleITK" in loaded and "pydicom" in loaded
+
+
+def test_public_names():
+    for name in umtk.__all__:
+        assert getattr(umtk, name) is not None
+    assert "read_dicoms" in dir(umtk)
+    assert umtk.Pipeline is umtk.image.Pipeline
+    # modules star-imported by umtk before it was lazy
+    assert umtk.geometry is umtk.image.geometry
+    assert umtk.md5 is umtk.utils.md5
+    assert umtk.exceptions is umtk.error_handling.exceptions
+    assert "io" in dir(umtk)
+
+
+def _get_import_time(code):
+    """ Time (s) spent importing modules by code, and the imported module
+    names, from python -X importtime (interpreter startup excluded).
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stderr=subprocess.PIPE, check=True
+    ).stderr.decode()
+    seconds, modules = 0., []
+    for line in output.splitlines()[1:]:
+        _, cumulative, module = line.split("|")
+        modules.append(module.strip())
+        if not module.startswith("  "):  # top level imports
+            seconds += int(cumulative) / 1e6
+    return seconds, modules
+
+
+def test_import_time_benchmark():
+    lazy, modules = _get_import_time("import umtk")
+    full, _ = _get_import_time("import umtk; umtk.read_dicoms")
+    print("import umtk: {:.3f}s, with umtk.read_dicoms: {:.3f}s".format(
+        lazy, full))
+    assert not any(m.split(".")[0] in HEAVY_MODULES for m in modules)
+    assert lazy < full
@@ -1,7 +1,27 @@
 # flake8: noqa
+# Names are imported from their submodules on first access, so heavy
+# dependencies (torch, SimpleITK, pydicom, h5py, cupy...) load only when used.
 from .__version__ import __version__
-from .cupy_utils import *
-from .error_handling import *
-from .image import *
-from .utils import *
-from .visualization import *
+from ._lazy import attach
+from . import cupy_utils, error_handling, image, utils, visualization
+
+__getattr__, __dir__, __all__ = attach(__name__, {
+    ".cupy_utils": cupy_utils.__all__,
+    ".error_handling": error_handling.__all__,
+    ".image": image.__all__,
+    ".utils": utils.__all__,
+    ".visualization": visualization.__all__,
+}, submodules=[
+    # modules which used to be star-imported from the subpackages
+    "cupy_utils.convert",
+    "cupy_utils.morphology",
+    "image.functional",
+    "image.geometry",
+    "image.io",
+    "image.normalize",
+    "utils.encryption",
+    "utils.ftp",
+    "utils.md5",
+    "utils.multiprocess",
+    "utils.timer",
+])
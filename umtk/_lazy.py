@@ -0,0 +1,54 @@
+import importlib
+import sys
+from typing import Callable, Dict, List, Sequence, Tuple
+
+
+def attach(
+    package_name: str,
+    exports: Dict[str, Sequence[str]],
+    submodules: Sequence[str] = (),
+) -> Tuple[Callable, Callable, List[str]]:
+    """ Export names of submodules from a package, loaded on first access.
+
+    Args:
+        package_name: __name__ of the package.
+        exports: relative submodule name (e.g. ".io") -> names exported
+            from it.
+        submodules: submodules accessible as attributes of the package, a
+            dotted name (e.g. "image.io") is accessible by its last
+            component ("io").
+
+    Returns:
+        __getattr__, __dir__ and __all__ of the package.
+
+    Example (in a package __init__.py):
+    >>> __getattr__, __dir__, __all__ = attach(__name__, {
+    >>>     ".md5": ["compute_md5_str"],
+    >>> })
+    """
+    modules = {
+        name: module for module, names in exports.items() for name in names
+    }
+    submodules = {name.rsplit(".", 1)[-1]: name for name in submodules}
+
+    def __getattr__(name):
+        if name in modules:
+            module = importlib.import_module(modules[name], package_name)
+            value = getattr(module, name)
+        elif name in submodules:
+            value = importlib.import_module(
+                "." + submodules[name], package_name
+            )
+        else:
+            raise AttributeError("module {!r} has no attribute {!r}".format(
+                package_name, name))
+
+        # cache it, __getattr__ is only called for missing attributes
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__():
+        package = sys.modules[package_name]
+        return sorted(set(vars(package)) | set(modules) | set(submodules))
+
+    return __getattr__, __dir__, list(modules)
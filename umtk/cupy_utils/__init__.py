@@ -1,11 +1,17 @@
 # flake8: noqa
 
-from .convert import (
-    tensor2cupy_gpu,
-    cupy2tensor_gpu,
-    cupy2numpy,
-    numpy2cupy
-)
-from .morphology import remove_small_objects_gpu
+from umtk._lazy import attach
 
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    ".convert": [
+        "tensor2cupy_gpu",
+        "cupy2tensor_gpu",
+        "cupy2numpy",
+        "numpy2cupy",
+    ],
+    ".morphology": [
+        "remove_small_objects_gpu",
+        "keep_largest_connected_component_gpu",
+        "remove_small_holes_gpu",
+    ],
+}, submodules=["convert", "morphology"])
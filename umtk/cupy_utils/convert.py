@@ -1,31 +1,54 @@
-import cupy
-from cupy.core.dlpack import toDlpack, fromDlpack
 import numpy as np
 import torch
 from torch.utils.dlpack import to_dlpack, from_dlpack
+from umtk.utils.backend import import_cupy, is_cupy_array
 
 
-def tensor2cupy_gpu(torch_tensor: torch.Tensor) -> cupy.ndarray:
-    """ Convert a pytorch tensor to cupy array."""
+def tensor2cupy_gpu(torch_tensor: torch.Tensor):
+    """ Convert a pytorch tensor to cupy array.
+
+    A cpu tensor is converted to a numpy array (sharing memory).
+    """
+    if torch_tensor.device.type == "cpu":
+        return torch_tensor.numpy()
+
+    cupy = import_cupy()
     with cupy.cuda.Device(torch_tensor.device.index):
-        cupy_array = fromDlpack(to_dlpack(torch_tensor))
+        from_dlpack_cupy = getattr(cupy, "from_dlpack", None) or \
+            cupy.fromDlpack
+        cupy_array = from_dlpack_cupy(to_dlpack(torch_tensor))
         return cupy_array
 
 
-def cupy2tensor_gpu(cupy_array: cupy.ndarray) -> torch.Tensor:
-    """ Convert a cupy array to pytorch tensor."""
-    return from_dlpack(toDlpack(cupy_array))
+def cupy2tensor_gpu(cupy_array) -> torch.Tensor:
+    """ Convert a cupy array to pytorch tensor.
+
+    A numpy array is converted to a cpu tensor (sharing memory).
+    """
+    if not is_cupy_array(cupy_array):
+        return torch.from_numpy(cupy_array)
+    return from_dlpack(cupy_array.toDlpack())
 
 
-def cupy2numpy(cupy_array: cupy.ndarray) -> np.ndarray:
-    """ Convert a cupy array to numpy array."""
-    return cupy.asnumpy(cupy_array)
+def cupy2numpy(cupy_array) -> np.ndarray:
+    """ Convert a cupy array to numpy array.
+
+    A numpy array is returned as is.
+    """
+    if not is_cupy_array(cupy_array):
+        return np.asarray(cupy_array)
+    return import_cupy().asnumpy(cupy_array)
 
 
 def numpy2cupy(
     numpy_array: np.ndarray,
     device_index: int = 0
-) -> cupy.ndarray:
-    """ Convert a numpy array to cupy array."""
+):
+    """ Convert a numpy array to cupy array.
+
+    Raises:
+        ImportError: cupy is not installed.
+    """
+    cupy = import_cupy()
     with cupy.cuda.Device(device_index):
         return cupy.asarray(numpy_array)
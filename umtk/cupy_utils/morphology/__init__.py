@@ -1,9 +1,11 @@
 # flake8: noqa
 
-from .misc import (
-    remove_small_objects_gpu,
-    keep_largest_connected_component_gpu,
-    remove_small_holes_gpu,
-)
+from umtk._lazy import attach
 
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    ".misc": [
+        "remove_small_objects_gpu",
+        "keep_largest_connected_component_gpu",
+        "remove_small_holes_gpu",
+    ],
+}, submodules=["misc"])
@@ -1,37 +1,44 @@
-import cupy
-from cupyx.scipy.ndimage import label
+from umtk.image import morphology as cpu
+from umtk.utils.backend import import_cupy, is_cupy_array
 
 
 def _check_dtype_supported(ar):
+    cupy = import_cupy()
     if not (ar.dtype == bool or cupy.issubdtype(ar.dtype, cupy.integer)):
         raise TypeError(
             "Only bool or integer types are supported. Got %s." % ar.dtype
         )
 
 
-def remove_small_objects_gpu(
-    mask: cupy.ndarray,
-    min_size: int
-) -> None:
+def _label(mask):
+    from cupyx.scipy.ndimage import label
+    return label(mask)[0] if mask.dtype == bool else mask
+
+
+def remove_small_objects_gpu(mask, min_size: int) -> None:
     """ See scikit-image remove_small_objects()
 
     N.B.
         Input array can be a binary mask (bool type) or
         labeled mask (int type).
         This is a inplace operation.
+        A numpy array is processed on cpu by
+        umtk.image.morphology.remove_small_objects().
     """
+    if not is_cupy_array(mask):
+        return cpu.remove_small_objects(mask, min_size)
+
+    cupy = import_cupy()
     _check_dtype_supported(mask)
 
-    ccs, _ = label(mask) if mask.dtype == bool else mask
+    ccs = _label(mask)
     component_sizes = cupy.bincount(ccs.ravel())
     too_small = component_sizes < min_size
     too_small_mask = too_small[ccs]
     mask[too_small_mask] = 0
 
 
-def keep_largest_connected_component_gpu(
-    mask: cupy.ndarray,
-) -> None:
+def keep_largest_connected_component_gpu(mask) -> None:
     """ Keep the largest connected component.
 
     Remove small connected components, only keep the largest
@@ -42,9 +49,15 @@ def keep_largest_connected_component_gpu(
         labeled mask (int type).
 
         This is a inplace operation.
+        A numpy array is processed on cpu by
+        umtk.image.morphology.keep_largest_connected_component().
     """
+    if not is_cupy_array(mask):
+        return cpu.keep_largest_connected_component(mask)
+
+    cupy = import_cupy()
     _check_dtype_supported(mask)
-    ccs, _ = label(mask) if mask.dtype == bool else mask
+    ccs = _label(mask)
     component_sizes = cupy.bincount(ccs.ravel())
     if len(component_sizes) == 1:  # just background
         return
@@ -52,17 +65,20 @@ def keep_largest_connected_component_gpu(
     mask[ccs != largest_cc_index] = 0
 
 
-def remove_small_holes_gpu(
-    mask: cupy.ndarray,
-    area_threshold: int,
-) -> None:
+def remove_small_holes_gpu(mask, area_threshold: int) -> None:
     """ See scikit-image remove_small_holes()
 
     N.B.
         Input array must be a binary mask (bool type) or
         labeled mask (int type).
         This is a inplace operation.
+        A numpy array is processed on cpu by
+        umtk.image.morphology.remove_small_holes().
     """
+    if not is_cupy_array(mask):
+        return cpu.remove_small_holes(mask, area_threshold)
+
+    cupy = import_cupy()
     _check_dtype_supported(mask)
 
     cupy.logical_not(mask, out=mask)
@@ -14,6 +14,7 @@ from .exceptions import (
     InconsistentZPixelSpacingError,
     IncorrectZPixelSpacingError,
     ReduplicateInstanceNumberError,
+    UnknownError,
 )
 
 __all__ = [k for k in globals().keys() if not k.startswith("_")]
@@ -80,3 +80,9 @@ class IncorrectZPixelSpacingError(BaseError):
     def __init__(self, error_msg):
         super().__init__(error_msg)
         self.error_code = BaseErrorCode.INCORRECT_ZPIXEL_SPACING_ERROR
+
+
+class UnknownError(BaseError):
+    def __init__(self, error_msg):
+        super().__init__(error_msg)
+        self.error_code = BaseErrorCode.UNKNOWN_ERROR
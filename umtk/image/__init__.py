@@ -1,22 +1,73 @@
 # flake8: noqa
 
-from .functional import gamma_transform
-from .geometry import (
-    zflip,
-    yflip,
-    xflip,
-    resize,
-    crop,
-    center_crop
-)
-from .io import read_itk, read_h5, write_h5
-from .normalize import (
-    normalize_mean_std,
-    normalize_fixed,
-    normalize_adaptive,
-    imadjust
-)
-from .read_dicoms import read_dicoms
-from .utils import isdicom
+from umtk._lazy import attach
 
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    ".dicom_index": ["DicomIndex"],
+    ".functional": ["gamma_transform"],
+    ".geometry": [
+        "zflip",
+        "yflip",
+        "xflip",
+        "flip",
+        "reorient",
+        "resize",
+        "resize_batch",
+        "resize_to_spacing",
+        "get_spacing_size",
+        "resample_to_spacing",
+        "resample_batch",
+        "crop",
+        "center_crop",
+        "crop_to_foreground",
+    ],
+    ".io": [
+        "H5Dict",
+        "get_array_view",
+        "read_itk",
+        "read_h5",
+        "write_h5",
+        "read_volume_cache",
+        "write_volume_cache",
+    ],
+    ".loader": ["read_volume", "iter_volumes"],
+    ".lut": ["IntensityLUT", "get_imadjust_transform"],
+    ".morphology": [
+        "remove_small_objects",
+        "keep_largest_connected_component",
+        "remove_small_holes",
+    ],
+    ".normalize": [
+        "normalize_mean_std",
+        "normalize_fixed",
+        "normalize_adaptive",
+        "imadjust",
+        "fast_percentile",
+    ],
+    ".patch": [
+        "get_patch_starts",
+        "extract_patches",
+        "get_sliding_windows",
+        "PatchStitcher",
+    ],
+    ".pipeline": ["Pipeline"],
+    ".read_dicoms": ["read_dicoms"],
+    ".scan_series": ["DicomSeries", "scan_series"],
+    ".stream": ["iter_dicom_slabs", "iter_itk_slabs"],
+    ".utils": ["isdicom"],
+}, submodules=[
+    "dicom_index",
+    "functional",
+    "geometry",
+    "io",
+    "loader",
+    "lut",
+    "morphology",
+    "normalize",
+    "patch",
+    "pipeline",
+    "read_dicoms",
+    "scan_series",
+    "stream",
+    "utils",
+])
@@ -0,0 +1,178 @@
+import json
+import os
+from pathlib import Path
+import sqlite3
+from typing import Any, Callable, Dict, List, Union
+import pydicom
+from pydicom.multival import MultiValue
+import SimpleITK
+import umtk.error_handling as exc
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS headers (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    tags TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    files TEXT NOT NULL
+);
+"""
+
+# number of paths per "IN (...)" query, sqlite allows 999 variables at most
+_QUERY_SIZE = 500
+
+
+class HeaderRecord:
+    """ Parsed header fields of a dicom file restored from a DicomIndex.
+
+    Tags are exposed as attributes named by their keyword like on a pydicom
+    dataset, a missing tag raises AttributeError.
+    """
+    def __init__(self, filename: str, tags: Dict[str, Any]):
+        self.filename = filename
+        self.__dict__.update(tags)
+
+    def __repr__(self):
+        return "HeaderRecord({!r})".format(self.filename)
+
+
+def _to_json_value(value):
+    if isinstance(value, (MultiValue, list, tuple)):
+        return [_to_json_value(v) for v in value]
+    if isinstance(value, float):
+        return float(value)
+    if isinstance(value, int):
+        return int(value)
+    return str(value)
+
+
+def _to_tags(header: pydicom.dataset.Dataset) -> Dict[str, Any]:
+    """ Get keyword -> value of all plain (non sequence, non binary) tags."""
+    tags = {}
+    for elem in header:
+        if not elem.keyword or elem.VR in ("SQ", "OB", "OW", "OF", "UN"):
+            continue
+        tags[elem.keyword] = _to_json_value(elem.value)
+    return tags
+
+
+def _stat(path: Union[str, Path]):
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        raise exc.ReadDicomHeaderError(
+            "Failed to read dicom header [{}]".format(path)
+        ) from e
+    return st.st_size, st.st_mtime_ns
+
+
+class DicomIndex:
+    """ Persistent on-disk cache of parsed dicom headers.
+
+    Header fields are stored in a sqlite database keyed by absolute file
+    path. An entry is valid as long as the size and mtime of its file are
+    unchanged, so repeated reads of the same archive skip header parsing.
+    The series file list of a directory is cached the same way, keyed by
+    the directory mtime (which changes when files are added or removed).
+
+    Example:
+    >>> import umtk
+    >>> with umtk.DicomIndex("headers.sqlite") as index:
+    >>>     vtd = umtk.read_dicoms("series_dir", index=index)
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = str(path)
+        self.conn = sqlite3.connect(
+            self.path, timeout=60, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get_series_files(self, directory: Union[str, Path]) -> List[str]:
+        """ Cached version of ImageSeriesReader.GetGDCMSeriesFileNames()."""
+        key = os.path.abspath(directory)
+        mtime_ns = os.stat(directory).st_mtime_ns
+
+        row = self.conn.execute(
+            "SELECT mtime_ns, files FROM directories WHERE path = ?", (key,)
+        ).fetchone()
+        if row is not None and row[0] == mtime_ns:
+            return json.loads(row[1])
+
+        files = list(SimpleITK.ImageSeriesReader.GetGDCMSeriesFileNames(
+            str(directory)
+        ))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+                (key, mtime_ns, json.dumps(files))
+            )
+        return files
+
+    def _query(self, keys: List[str]) -> Dict[str, tuple]:
+        rows = {}
+        for i in range(0, len(keys), _QUERY_SIZE):
+            chunk = keys[i:i + _QUERY_SIZE]
+            rows.update((row[0], row[1:]) for row in self.conn.execute(
+                "SELECT path, size, mtime_ns, tags FROM headers "
+                "WHERE path IN ({})".format(", ".join("?" * len(chunk))),
+                chunk
+            ))
+        return rows
+
+    def read_headers(
+        self,
+        paths: List[Union[str, Path]],
+        read: Callable[[List[Union[str, Path]]], List[Any]],
+    ) -> List[HeaderRecord]:
+        """ Get header records of dicom files.
+
+        Args:
+            paths: dicom file paths.
+            read: function parsing the headers of the given paths,
+                only called for files missing or outdated in the index.
+
+        Returns:
+            header records in the same order as paths.
+        """
+        keys = [os.path.abspath(path) for path in paths]
+        stats = [_stat(path) for path in paths]
+        rows = self._query(keys)
+
+        records = [None] * len(paths)
+        missing = []
+        for i, (path, key, stat) in enumerate(zip(paths, keys, stats)):
+            row = rows.get(key)
+            if row is not None and tuple(row[:2]) == stat:
+                records[i] = HeaderRecord(str(path), json.loads(row[2]))
+            else:
+                missing.append(i)
+
+        if len(missing) == 0:
+            return records
+
+        headers = read([paths[i] for i in missing])
+        values = []
+        for i, header in zip(missing, headers):
+            tags = _to_tags(header)
+            records[i] = HeaderRecord(str(paths[i]), tags)
+            values.append((keys[i],) + stats[i] + (json.dumps(tags),))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO headers VALUES (?, ?, ?, ?)", values
+            )
+        return records
@@ -1,51 +1,459 @@
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 import numpy as np
 import torch
 import torch.nn.functional as F
+from umtk.utils.multiprocess import run_in_slabs
 
 
-def zflip(img: np.ndarray) -> np.ndarray:
-    return np.ascontiguousarray(img[::-1, :, :])
+def zflip(img: np.ndarray, copy: bool = True) -> np.ndarray:
+    return flip(img, (0,), copy)
 
 
-def yflip(img: np.ndarray) -> np.ndarray:
-    return np.ascontiguousarray(img[:, ::-1, :])
+def yflip(img: np.ndarray, copy: bool = True) -> np.ndarray:
+    return flip(img, (1,), copy)
 
 
-def xflip(img: np.ndarray) -> np.ndarray:
-    return np.ascontiguousarray(img[:, :, ::-1])
+def xflip(img: np.ndarray, copy: bool = True) -> np.ndarray:
+    return flip(img, (2,), copy)
+
+
+def flip(
+    img: np.ndarray,
+    axes: Sequence[int],
+    copy: bool = False
+) -> np.ndarray:
+    """ Flip an image along several axes at once.
+
+    Args:
+        img: image to be flipped.
+        axes: axes to be flipped.
+        copy: whether to return a contiguous copy, otherwise a strided view
+            of img is returned.
+
+    Returns:
+        the flipped image.
+    """
+    slices = [slice(None)] * img.ndim
+    for axis in axes:
+        slices[axis] = slice(None, None, -1)
+    dst = img[tuple(slices)]
+    return np.ascontiguousarray(dst) if copy else dst
+
+
+def reorient(
+    img: np.ndarray,
+    direction_zyx: Optional[np.ndarray] = None,
+    axes: Optional[Sequence[int]] = None,
+    copy: bool = False
+) -> np.ndarray:
+    """ Reorient an image by flips and a transpose applied as a single view.
+
+    Args:
+        img: image to be reoriented.
+        direction_zyx: direction of the image (e.g. vtd["direction_zyx"]),
+            axes whose direction is negative are flipped.
+        axes: permutation of the axes (after flipping) like np.transpose().
+        copy: whether to return a contiguous copy (the only copy made),
+            otherwise a strided view of img is returned.
+
+    Returns:
+        the reoriented image.
+    """
+    dst = img
+    if direction_zyx is not None:
+        dst = flip(dst, np.where(np.asarray(direction_zyx) < 0)[0])
+    if axes is not None:
+        dst = np.transpose(dst, axes)
+    return np.ascontiguousarray(dst) if copy else dst
+
+
+@contextmanager
+def _torch_num_threads(num_threads: Optional[int]):
+    """ Temporarily set the number of threads of torch cpu operations.
+
+    The setting is process-wide, so it is entered once by the calling thread
+    (before starting any worker), never by the workers themselves.
+    """
+    if num_threads is None:
+        yield
+        return
+
+    saved = torch.get_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(saved)
+
+
+def _get_nearest_indices(n_in: int, n_out: int) -> np.ndarray:
+    """ Source indices of a nearest resize, same as torch's (float32 scale).
+    """
+    scale = np.float32(n_in) / np.float32(n_out)
+    indices = np.floor(np.arange(n_out, dtype=np.float32) * scale)
+    return np.minimum(indices.astype(np.intp), n_in - 1)
+
+
+# number of voxels gathered at a time by _resize_nearest()
+_GATHER_CHUNK_SIZE = 1 << 20
+
+
+def _gather(src, indices, out):
+    """ out[...] = src[np.ix_(*indices)] through temporaries of about
+    _GATHER_CHUNK_SIZE voxels (at least a 2D plane), not a full-size one.
+    """
+    step = _GATHER_CHUNK_SIZE // max(1, out[0:1].size)
+    if step == 0 and out.ndim > 2:  # a single row is too large, split it
+        for i, j in enumerate(indices[0]):
+            _gather(src[j], indices[1:], out[i])
+        return
+
+    step = max(1, step)
+    for start in range(0, len(out), step):
+        out[start:start + step] = src[
+            np.ix_(indices[0][start:start + step], *indices[1:])
+        ]
+
+
+def _resize_nearest(src, size, out, num_threads):
+    """ Nearest resize of the last 3 axes, slab-parallel along axis 0."""
+    indices = [np.arange(n) for n in src.shape[:-3]] + [
+        _get_nearest_indices(n_in, n_out)
+        for n_in, n_out in zip(src.shape[-3:], size)
+    ]
+
+    def run(start, stop):
+        _gather(src, [indices[0][start:stop]] + indices[1:], out[start:stop])
+
+    run_in_slabs(run, len(out), num_threads)
+    return out
+
+
+def _resize_trilinear(src, size, dtype, out):
+    """ Trilinear resize of a batch of images (N, D, H, W) in one call."""
+    tensor = torch.from_numpy(np.ascontiguousarray(src, dtype=np.float32))
+    tensor = F.interpolate(
+        tensor.unsqueeze(1),
+        size=size,
+        mode="trilinear",
+        align_corners=False
+    )
+    dst = tensor.numpy()[:, 0, ...]
+
+    if out is None:
+        return dst if dtype == dst.dtype else dst.astype(dtype)
+    np.copyto(out, dst, casting="unsafe")
+    return out
 
 
 def resize(
     src: np.ndarray,
     size: Tuple,
     to_float: bool = False,
-    mode: str = "trilinear"
+    mode: str = "trilinear",
+    out: Optional[np.ndarray] = None,
+    num_threads: Optional[int] = None,
 ) -> np.ndarray:
     """ Resize an image to the given size.
 
+    Nearest resize gathers voxels in the native dtype (e.g. label maps are
+    never converted to float), trilinear resize runs on torch.
+
     Args:
         src: the given image.
         size: image size (in pixel) in DHW order.
-        device: computation device, support "cpu" and "cuda".
-            e.g. "cpu", "cuda", "cuda:0", "cuda:1".
         to_float: whether to convert the output image to float32.
         mode: interpolation mode, support "nearest" and "trilinear".
+        out: output array of the given size, of type float32 if to_float
+            else of the type of src. If None, a new array is allocated.
+        num_threads: number of cpu threads, None means the default of
+            torch (trilinear) or a single thread (nearest).
 
     Returns:
         the resized image.
     """
+    with _torch_num_threads(num_threads if mode == "trilinear" else None):
+        return _resize(src, size, to_float, mode, out, num_threads)
+
+
+def _resize(src, size, to_float, mode, out, num_threads):
+    """ resize() without setting the number of threads of torch."""
     assert mode in ("nearest", "trilinear")
-    tensor = torch.from_numpy(src.astype(np.float32))
-    tensor = tensor.unsqueeze(0).unsqueeze(0)
-    tensor = F.interpolate(
-        tensor,
-        size=size,
+    size = tuple(size)
+    dtype = np.dtype(np.float32) if to_float else src.dtype
+    if out is not None:
+        assert out.shape == size and out.dtype == dtype
+
+    if mode == "nearest":
+        if out is None:
+            out = np.empty(size, dtype=dtype)
+        return _resize_nearest(
+            src, size, out, 1 if num_threads is None else num_threads
+        )
+
+    dst = _resize_trilinear(
+        src[np.newaxis], size, dtype, None if out is None else out[np.newaxis]
+    )
+    return dst[0] if out is None else out
+
+
+def resize_batch(
+    srcs: Union[np.ndarray, Sequence[np.ndarray]],
+    size: Tuple,
+    to_float: bool = False,
+    mode: str = "trilinear",
+    out: Optional[np.ndarray] = None,
+    num_threads: Optional[int] = None,
+) -> np.ndarray:
+    """ Resize a batch of images (e.g. patches) of the same shape at once.
+
+    All images are resized by a single interpolation over the batch
+    dimension into a single output array, which saves the per-call
+    overhead of resize() on many small images.
+
+    Args:
+        srcs: images stacked in an array (N, D, H, W), or a list of
+            images of the same shape and type.
+        size: image size (in pixel) in DHW order.
+        to_float, mode, num_threads: see resize().
+        out: output array of shape (N,) + size, of type float32 if to_float
+            else of the type of the images. If None, a new array is
+            allocated.
+
+    Returns:
+        the resized images stacked in an array (N,) + size.
+    """
+    assert mode in ("nearest", "trilinear")
+    size = tuple(size)
+    dtype = np.dtype(np.float32) if to_float else srcs[0].dtype
+    shape = (len(srcs),) + size
+    if out is not None:
+        assert out.shape == shape and out.dtype == dtype
+
+    if mode == "nearest":
+        if not isinstance(srcs, np.ndarray):
+            srcs = np.stack(srcs)
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        return _resize_nearest(
+            srcs, size, out, 1 if num_threads is None else num_threads
+        )
+
+    if not isinstance(srcs, np.ndarray):
+        # stack the images right into the float32 input of torch
+        batch = np.empty((len(srcs),) + srcs[0].shape, dtype=np.float32)
+        for i, src in enumerate(srcs):
+            batch[i] = src
+        srcs = batch
+    with _torch_num_threads(num_threads):
+        return _resize_trilinear(srcs, size, dtype, out)
+
+
+def get_spacing_size(
+    shape: Tuple[int, int, int],
+    spacing_zyx: Tuple[float, float, float],
+    target_spacing_zyx: Tuple[float, float, float],
+) -> Tuple[int, int, int]:
+    """ Get the size of an image resampled to the given voxel spacing.
+
+    Args:
+        shape: image size (in pixel) in DHW order.
+        spacing_zyx: voxel spacing of the image.
+        target_spacing_zyx: voxel spacing after resampling.
+
+    Returns:
+        the image size (in pixel, at least 1) after resampling.
+    """
+    return tuple(
+        max(1, int(round(n * s / t)))
+        for n, s, t in zip(shape, spacing_zyx, target_spacing_zyx)
+    )
+
+
+def resize_to_spacing(
+    src: np.ndarray,
+    spacing_zyx: Tuple[float, float, float],
+    target_spacing_zyx: Tuple[float, float, float],
+    to_float: bool = False,
+    mode: str = "trilinear",
+    out: Optional[np.ndarray] = None,
+    num_threads: Optional[int] = None,
+) -> np.ndarray:
+    """ Resize an image to the given (anisotropic) voxel spacing.
+
+    Args:
+        src: the given image.
+        spacing_zyx: voxel spacing of the image, e.g. vtd["spacing_zyx"].
+        target_spacing_zyx: voxel spacing after resizing.
+        to_float, mode, out, num_threads: see resize().
+
+    Returns:
+        the resized image, of size get_spacing_size().
+    """
+    size = get_spacing_size(src.shape, spacing_zyx, target_spacing_zyx)
+    return resize(src, size, to_float, mode, out, num_threads)
+
+
+@lru_cache(maxsize=64)
+def _get_linear_weights(n_in: int, n_out: int):
+    """ Source indices and weights of a linear resize along one axis, same
+    as torch's (align_corners=False).
+    """
+    scale = np.float32(n_in) / np.float32(n_out)
+    positions = (np.arange(n_out, dtype=np.float32) + 0.5) * scale - 0.5
+    positions = np.maximum(positions, 0)
+    i0 = positions.astype(np.intp)
+    i1 = np.minimum(i0 + 1, n_in - 1)
+    w1 = positions - i0
+    return i0, i1, 1 - w1, w1
+
+
+def _resample_trilinear(src, size, out, num_threads):
+    """ Trilinear resize, slab-parallel: bilinear in-plane resize of input
+    z-slabs, then linear interpolation along z of output z-slabs.
+
+    Torch should be single-threaded if slabs run in parallel, see
+    _get_resample_torch_threads().
+    """
+    planes = np.empty((len(src),) + tuple(size[1:]), dtype=np.float32)
+
+    def resize_planes(start, stop):
+        tensor = torch.from_numpy(
+            np.ascontiguousarray(src[start:stop], dtype=np.float32)
+        )
+        tensor = F.interpolate(
+            tensor.unsqueeze(1),
+            size=size[1:],
+            mode="bilinear",
+            align_corners=False
+        )
+        planes[start:stop] = tensor.numpy()[:, 0]
+
+    i0, i1, w0, w1 = _get_linear_weights(len(src), size[0])
+
+    def interpolate_z(start, stop):
+        buffer = np.empty(size[1:], dtype=np.float32)
+        for z in range(start, stop):
+            np.multiply(planes[i0[z]], w0[z], out=buffer)
+            buffer += w1[z] * planes[i1[z]]
+            np.copyto(out[z], buffer, casting="unsafe")
+
+    run_in_slabs(resize_planes, len(src), num_threads)
+    run_in_slabs(interpolate_z, size[0], num_threads)
+    return out
+
+
+def _get_resample_torch_threads(num_threads, num_workers=0):
+    """ Number of torch threads for resampling: the default of torch if a
+    single series is resampled in the calling thread, else 1 (slabs or
+    series run in parallel already).
+    """
+    return None if num_threads == 1 and num_workers <= 0 else 1
+
+
+def resample_to_spacing(
+    vtd: Dict[str, Any],
+    target_spacing_zyx: Tuple[float, float, float],
+    mode: str = "trilinear",
+    to_float: bool = False,
+    num_threads: Optional[int] = None,
+) -> Dict[str, Any]:
+    """ Resample an image to the given voxel spacing.
+
+    The image is resized to get_spacing_size() voxels, so the spacing
+    after resampling is the closest to target_spacing_zyx which covers the
+    same physical extent. The origin moves to the center of the first
+    resampled voxel.
+
+    Args:
+        vtd: dict returned by read_dicoms() / read_itk() / read_volume().
+        target_spacing_zyx: voxel spacing after resampling.
+        mode: interpolation mode, support "nearest" and "trilinear".
+            Trilinear resampling is the same as resize() up to float
+            rounding.
+        to_float: whether to convert the output image to float32.
+        num_threads: number of threads processing slabs in parallel, None
+            means all available cores.
+
+    Returns:
+        a new dict with the resampled "image_zyx" and its "spacing_zyx"
+        and "origin_zyx", other entries are copied ("image_itk" is None).
+    """
+    with _torch_num_threads(_get_resample_torch_threads(num_threads)):
+        return _resample_to_spacing(
+            vtd, target_spacing_zyx, mode, to_float, num_threads
+        )
+
+
+def _resample_to_spacing(vtd, target_spacing_zyx, mode, to_float, num_threads):
+    """ resample_to_spacing() without setting the number of threads of torch.
+    """
+    assert mode in ("nearest", "trilinear")
+    src = vtd["image_zyx"]
+    spacing_zyx = np.asarray(vtd["spacing_zyx"], dtype=np.float64)
+    size = get_spacing_size(src.shape, spacing_zyx, target_spacing_zyx)
+    out = np.empty(size, dtype=np.float32 if to_float else src.dtype)
+
+    if mode == "nearest":
+        _resize_nearest(src, size, out, num_threads)
+    else:
+        _resample_trilinear(src, size, out, num_threads)
+
+    new_spacing_zyx = spacing_zyx * src.shape / size
+    new_origin_zyx = np.asarray(vtd["origin_zyx"], dtype=np.float64) + \
+        np.asarray(vtd["direction_zyx"]) * (new_spacing_zyx - spacing_zyx) / 2
+
+    dst = {
+        key: vtd[key] for key in vtd if key not in ("image_itk", "image_zyx")
+    }
+    dst.update({
+        "image_itk": None,
+        "image_zyx": out,
+        "spacing_zyx": new_spacing_zyx,
+        "origin_zyx": new_origin_zyx,
+    })
+    return dst
+
+
+def resample_batch(
+    vtds: Sequence[Dict[str, Any]],
+    target_spacing_zyx: Tuple[float, float, float],
+    mode: str = "trilinear",
+    to_float: bool = False,
+    num_workers: int = 0,
+    num_threads: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """ Resample many series to a common voxel spacing.
+
+    Interpolation weights are shared by series of the same geometry.
+
+    Args:
+        vtds: dicts returned by read_dicoms() / read_itk() / read_volume().
+        target_spacing_zyx, mode, to_float: see resample_to_spacing().
+        num_workers: number of series resampled in parallel, 0 means one at
+            a time in the calling thread.
+        num_threads: number of threads processing slabs of each series in
+            parallel, None means all available cores.
+
+    Returns:
+        the resampled dicts (see resample_to_spacing()) in the same order.
+    """
+    func = partial(
+        _resample_to_spacing,
+        target_spacing_zyx=target_spacing_zyx,
         mode=mode,
-        align_corners=None if mode == "nearest" else False
+        to_float=to_float,
+        num_threads=num_threads
     )
-    dst = tensor.numpy()[0, 0, ...]
-    return dst if to_float else dst.astype(src.dtype)
+    torch_threads = _get_resample_torch_threads(num_threads, num_workers)
+    with _torch_num_threads(torch_threads):
+        if num_workers <= 0:
+            return [func(vtd) for vtd in vtds]
+        with ThreadPoolExecutor(num_workers) as pool:
+            return list(pool.map(func, vtds))
 
 
 def crop(
@@ -97,3 +505,97 @@ def center_crop(
         crop_depth, crop_height, crop_width
     )
     return img[z1:z2, y1:y2, x1:x2]
+
+
+# number of slices thresholded at a time by crop_to_foreground()
+_FOREGROUND_SLAB_DEPTH = 16
+
+
+def _get_extent(profile: np.ndarray, margin: int) -> Tuple[int, int]:
+    indices = np.flatnonzero(profile)
+    start = max(0, int(indices[0]) - margin)
+    stop = min(len(profile), int(indices[-1]) + 1 + margin)
+    return start, stop - start
+
+
+def crop_to_foreground(
+    img: np.ndarray,
+    threshold: Optional[float] = None,
+    mask: Optional[np.ndarray] = None,
+    margin: Union[int, Tuple[int, int, int]] = 0,
+    num_threads: int = 1,
+) -> Tuple[np.ndarray, Tuple[int, int, int], Tuple[int, int, int]]:
+    """ Crop the bounding box of the foreground of an image.
+
+    The extent along each axis is computed from any() projections of the
+    foreground, walking the volume in fixed-size z-slabs (whatever the
+    number of threads), so neither the coordinates of foreground voxels nor
+    (given a threshold) a full mask are materialized.
+
+    Args:
+        img: image to be cropped.
+        threshold: voxels greater than threshold are foreground.
+        mask: foreground mask of the same shape as img, used if threshold
+            is None.
+        margin: number of voxels kept around the foreground, per axis if a
+            tuple.
+        num_threads: number of threads processing z-slabs in parallel,
+            None means all available cores.
+
+    Returns:
+        the cropped view of img, and start_point and crop_size of the crop
+        (see crop()). If there is no foreground, the whole image is kept.
+    """
+    assert (threshold is None) != (mask is None)
+    if mask is not None:
+        assert mask.shape == img.shape
+    margins = (margin,) * 3 if np.isscalar(margin) else tuple(margin)
+
+    profile_z = np.zeros(img.shape[0], dtype=bool)
+
+    def project(start, stop):
+        profile_yx = np.zeros(img.shape[1:], dtype=bool)
+        for z1 in range(start, stop, _FOREGROUND_SLAB_DEPTH):
+            z2 = min(z1 + _FOREGROUND_SLAB_DEPTH, stop)
+            fg = mask[z1:z2] if mask is not None else img[z1:z2] > threshold
+            profile_z[z1:z2] = fg.any(axis=(1, 2))
+            profile_yx |= fg.any(axis=0)
+        return profile_yx
+
+    profile_yx = np.logical_or.reduce(
+        run_in_slabs(project, len(img), num_threads)
+    )
+    if not profile_z.any():
+        return img, (0, 0, 0), tuple(img.shape)
+
+    extents = [
+        _get_extent(profile, m) for profile, m in zip(
+            (profile_z, profile_yx.any(axis=1), profile_yx.any(axis=0)),
+            margins
+        )
+    ]
+    start_point = tuple(start for start, _ in extents)
+    crop_size = tuple(size for _, size in extents)
+    return crop(img, start_point, crop_size), start_point, crop_size
+
+
+if __name__ == "__main__":
+    import time
+
+    # per-call overhead: resizing many small patches one by one or at once
+    rng = np.random.RandomState(0)
+    for shape, size in (((2000, 8, 8, 8), (12, 12, 12)),
+                        ((1000, 16, 16, 16), (24, 24, 24)),
+                        ((500, 32, 32, 32), (16, 16, 16))):
+        patches = rng.normal(0, 100, shape).astype(np.float32)
+        for mode in ("trilinear", "nearest"):
+            tic = time.perf_counter()
+            for patch in patches:
+                resize(patch, size, mode=mode)
+            loop = time.perf_counter() - tic
+
+            tic = time.perf_counter()
+            resize_batch(patches, size, mode=mode)
+            batch = time.perf_counter() - tic
+            print("{} x {} -> {} {}: resize {:.3f}s, resize_batch {:.3f}s"
+                  .format(shape[0], shape[1:], size, mode, loop, batch))
@@ -1,8 +1,22 @@
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import itertools
+import json
+import logging
 import os
 from pathlib import Path
-from typing import Any, Dict, Union
+import re
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple, Union
+import zlib
 import numpy as np
 import h5py
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
 import SimpleITK
 import pydicom
 import umtk.error_handling as exc
@@ -10,26 +24,68 @@ import umtk.error_handling as exc
 
 def _get_file_title(path: Union[str, Path]):
     file_title = os.path.splitext(os.path.basename(path))[0]
-    if path.endswith(".nii.gz"):
+    if str(path).endswith(".nii.gz"):
         return os.path.splitext(file_title)[0]
     else:
         return file_title
 
 
+class _ItkBuffer:
+    """ Expose the pixel buffer of an itk image through the numpy array
+    interface, the image is kept alive as long as an array uses it.
+    """
+    def __init__(self, image_itk: SimpleITK.Image):
+        self.image_itk = image_itk
+        interface = SimpleITK.GetArrayViewFromImage(image_itk).\
+            __array_interface__
+        interface["data"] = (interface["data"][0], False)
+        self.__array_interface__ = interface
+
+
+def get_array_view(image_itk: SimpleITK.Image) -> np.ndarray:
+    """ Get a zero-copy array of an itk image in ZYX order.
+
+    Unlike SimpleITK.GetArrayViewFromImage(), the returned array keeps the
+    image alive and is writable, writing to it modifies the image.
+    """
+    return np.asarray(_ItkBuffer(image_itk))
+
+
 def read_itk(
         path: Union[str, Path],
+        zero_copy: bool = False,
+        keep_itk: bool = True,
+        load_image: bool = True,
 ) -> Dict[str, Any]:
     """ Read an itk format image.
 
     Args:
         path: itk image file path.
+        zero_copy: whether "image_zyx" should share the pixel buffer of the
+            itk image instead of being a copy of it.
+        keep_itk: whether to keep the itk image as "image_itk", otherwise
+            "image_itk" is None. With zero_copy=False the itk image is
+            released right after copying its pixels.
+        load_image: whether to read pixels. If False only the image header
+            is read and the dict has "shape_zyx" instead of "image_itk" and
+            "image_zyx".
 
     Returns:
         dict containing volume data and dicom tags.
     """
     try:
-        image_itk = SimpleITK.ReadImage(str(path))
-        image = SimpleITK.GetArrayFromImage(image_itk)
+        if load_image:
+            image_itk = SimpleITK.ReadImage(str(path))
+            if zero_copy:
+                image = get_array_view(image_itk)
+            else:
+                image = SimpleITK.GetArrayFromImage(image_itk)
+            shape = image.shape
+        else:
+            image_itk = SimpleITK.ImageFileReader()
+            image_itk.SetFileName(str(path))
+            image_itk.ReadImageInformation()
+            shape = image_itk.GetSize()[::-1]
     except Exception as e:
         raise exc.ReadDicomDataError(
             "Failed to read dicom data, file path=[{}]".format(path)
@@ -42,15 +98,18 @@ def read_itk(
 
     vtd = {
         "series_id": _get_file_title(path),
-        "instances": list(range(1, image.shape[0] + 1)),
-
-        "image_itk": image_itk,
-        "image_zyx": image,
-
+        "instances": list(range(1, shape[0] + 1)),
+    }
+    if load_image:
+        vtd["image_itk"] = image_itk if keep_itk else None
+        vtd["image_zyx"] = image
+    else:
+        vtd["shape_zyx"] = tuple(shape)
+    vtd.update({
         "spacing_zyx": spacing,
         "direction_zyx": direction,
         "origin_zyx": origin,
-    }
+    })
     return vtd
 
 
@@ -67,50 +126,318 @@ def read_npz(path: Union[str, Path]):
     return vtd
 
 
-PLACEHOLDER = np.NAN
+_CACHE_META_FILE = "meta.json"
+
 
+def _to_json(value):
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    return str(value)
 
-def __array_fill_in(unequal_length_arr):
-    """ Fill arrays of different shapes to uniform length
+
+def _get_cache_name(index: int, key: Any) -> str:
+    """ A file name of a key, unique in its directory and safe whatever the
+    key is (e.g. "../x" or "a/b").
+    """
+    return "{:03d}_{}".format(index, re.sub(r"[^\w.-]", "_", str(key)))
+
+
+def _write_volume_cache(cache_dir: str, vtd: Dict[str, Any]) -> None:
+    meta = {
+        "keys": [], "arrays": [], "groups": [], "values": {}, "files": {}
+    }
+    for i, k in enumerate(vtd.keys()):
+        meta["keys"].append(k)
+        if k == "image_itk":
+            continue  # not saved, and not built if it is lazy (LazyDict)
+        v = vtd[k]
+        path = os.path.join(cache_dir, _get_cache_name(i, k))
+        if isinstance(v, np.ndarray) and not v.dtype.hasobject:
+            np.save(path + ".npy", v)
+            meta["arrays"].append(k)
+            meta["files"][k] = os.path.basename(path)
+        elif isinstance(v, dict):
+            os.mkdir(path)
+            _write_volume_cache(path, v)
+            meta["groups"].append(k)
+            meta["files"][k] = os.path.basename(path)
+        elif not isinstance(v, SimpleITK.Image):
+            meta["values"][k] = _to_json(v)
+
+    with open(os.path.join(cache_dir, _CACHE_META_FILE), "w") as f:
+        json.dump(meta, f)
+
+
+def write_volume_cache(
+    cache_dir: Union[str, Path],
+    vtd: Dict[str, Any],
+) -> None:
+    """ Write a volume dict as a memory-mappable cache directory.
+
+    Each numpy array is saved as a raw .npy file, nested dicts go to sub
+    directories and other values to a small json sidecar. The itk image
+    is not saved. The cache is written to a temporary directory which then
+    replaces cache_dir, so readers never see a partly written cache (and
+    arrays of a replaced cache which are memory-mapped stay valid).
 
     Args:
-        unequal_length_arr: [arr1, arr2, arr3, ...], the shape of the array can be unequal, but the depth must be equal
+        cache_dir: cache directory, created or replaced.
+        vtd: dict returned by read_dicoms(), read_itk(), etc.
+    """
+    cache_dir = os.path.abspath(str(cache_dir))
+    parent = os.path.dirname(cache_dir)
+    os.makedirs(parent, exist_ok=True)
+
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp_cache_", dir=parent)
+    try:
+        _write_volume_cache(tmp_dir, vtd)
+        if os.path.isdir(cache_dir):
+            old_dir = tmp_dir + "_old"
+            os.replace(cache_dir, old_dir)
+            os.replace(tmp_dir, cache_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
 
-    Returns:
 
+def read_volume_cache(
+    cache_dir: Union[str, Path],
+    mmap_mode: Optional[str] = "r",
+) -> Dict[str, Any]:
+    """ Read a cache directory written by write_volume_cache().
+
+    Args:
+        cache_dir: cache directory.
+        mmap_mode: memory-map mode of arrays (see numpy.load), pages of
+            a memory-mapped array are only read from disk when touched.
+            None loads arrays into memory.
+
+    Returns:
+        dict with the same keys as the cached dict, "image_itk" is None.
     """
-    unequal_length_arr = list(unequal_length_arr)
+    with open(os.path.join(str(cache_dir), _CACHE_META_FILE)) as f:
+        meta = json.load(f)
+
+    vtd = {}
+    for k in meta["keys"]:
+        if k in meta["arrays"] or k in meta["groups"]:
+            path = os.path.join(str(cache_dir), meta["files"][k])
+        if k in meta["arrays"]:
+            vtd[k] = np.load(path + ".npy", mmap_mode=mmap_mode)
+        elif k in meta["groups"]:
+            vtd[k] = read_volume_cache(path, mmap_mode)
+        else:
+            vtd[k] = meta["values"].get(k)
+    return vtd
 
-    shapes = [np.shape(arr) if len(arr) > 0 else [] for arr in unequal_length_arr]
-    depths = np.array([len(shape) for shape in shapes])
-    shapes = np.array(shapes)[depths != 0]
-    depths = np.unique(depths[depths != 0])
+
+PLACEHOLDER = np.nan
+
+
+def _as_ragged(unequal_length_arr) -> List[np.ndarray]:
+    """ Convert elements to arrays of the same depth.
+
+    Args:
+        unequal_length_arr: [arr1, arr2, arr3, ...], the shape of the array
+            can be unequal, but the depth must be equal. Empty elements
+            take the depth of the others.
+    """
+    arrays = [np.asarray(arr) for arr in unequal_length_arr]
+    depths = set(arr.ndim for arr in arrays if arr.size != 0)
     assert len(depths) <= 1, 'The depth of the array must be equal.'
+    depth = depths.pop() if len(depths) != 0 else 1
+    return [
+        arr if arr.ndim == depth else arr.reshape((0,) * depth)
+        for arr in arrays
+    ]
+
+
+def _write_ragged_flat(f, key, arrays, options):
+    """ Store arrays as a flat values buffer plus offsets and shapes."""
+    non_empty = [arr for arr in arrays if arr.size != 0]
+    dtype = np.result_type(*non_empty) if non_empty else np.float64
+    sizes = [arr.size for arr in arrays]
+
+    values = np.empty(sum(sizes), dtype=dtype)
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    for arr, start, stop in zip(arrays, offsets[:-1], offsets[1:]):
+        values[start:stop] = arr.ravel()
+
+    group = f.create_group(key)
+    group.attrs["ragged"] = "flat"
+    _create_dataset(group, "values", values, options)
+    _create_dataset(group, "offsets", offsets, options)
+    _create_dataset(
+        group, "shapes",
+        np.array([arr.shape for arr in arrays], dtype=np.int64), options
+    )
+
+
+def _fill_in(arrays: List[np.ndarray]) -> np.ndarray:
+    """ Pad arrays with PLACEHOLDER into one preallocated array."""
+    if len(arrays) == 0:
+        return np.zeros(0)
+    shape_max = np.max([arr.shape for arr in arrays], axis=0)
+    equal_length_arr = np.full(
+        (len(arrays),) + tuple(shape_max), PLACEHOLDER
+    )
+    for dst, arr in zip(equal_length_arr, arrays):
+        dst[tuple(slice(0, n) for n in arr.shape)] = arr
+    return equal_length_arr
+
+
+def _read_ragged(group: h5py.Group) -> List[np.ndarray]:
+    values = group["values"][()]
+    offsets = group["offsets"][()]
+    shapes = group["shapes"][()]
+    return [
+        values[start:stop].reshape(shape)
+        for start, stop, shape in zip(offsets[:-1], offsets[1:], shapes)
+    ]
+
+
+_hdf5plugin_warned = False
+
+
+def _get_codec(codec: Optional[str]) -> Tuple[Dict[str, Any], int]:
+    """ Get create_dataset() compression kwargs of a codec.
 
-    if len(shapes) != 0:
-        shapes = np.array(list(shapes))
-        shape_max = np.max(shapes, axis=0)
-    else:
-        return unequal_length_arr
+    Returns:
+        kwargs, and the gzip level if chunks can be compressed by zlib
+        (-1 otherwise).
+    """
+    global _hdf5plugin_warned
+    name, _, level = (codec or "none").partition(":")
+    if name in ("blosc", "zstd") and hdf5plugin is None:
+        if not _hdf5plugin_warned:
+            logging.warning("hdf5plugin is not installed, use gzip instead "
+                            "of [%s].", name)
+            _hdf5plugin_warned = True
+        name, level = "gzip", ""
+    if name == "none":
+        return {}, -1
+    if name == "lzf":
+        return {"compression": "lzf"}, -1
+    if name == "gzip":
+        level = int(level) if level else 4
+        return {"compression": "gzip", "compression_opts": level}, level
+    if name == "blosc":
+        return dict(hdf5plugin.Blosc(
+            cname="zstd", clevel=int(level) if level else 5,
+            shuffle=hdf5plugin.Blosc.SHUFFLE
+        )), -1
+    if name == "zstd":
+        return dict(hdf5plugin.Zstd(clevel=int(level) if level else 3)), -1
+    raise ValueError("Unsupported codec [{}]".format(codec))
+
+
+def _get_chunks(shape: Tuple[int, ...], chunks) -> Any:
+    if chunks is None:
+        return True
+    if chunks == "slice" and len(shape) >= 3:
+        return (1,) * (len(shape) - 2) + tuple(shape[-2:])
+    if chunks == "patch" and len(shape) >= 3:
+        return tuple(min(64, n) for n in shape)
+    if isinstance(chunks, (tuple, list)):
+        return tuple(min(c, n) for c, n in zip(chunks, shape))
+    return True
+
+
+def _compress_chunk(data: np.ndarray, index, chunks, level: int):
+    block = data[tuple(slice(i, i + c) for i, c in zip(index, chunks))]
+    if block.shape != tuple(chunks):  # edge chunks are stored full size
+        padded = np.zeros(chunks, dtype=data.dtype)
+        padded[tuple(slice(0, n) for n in block.shape)] = block
+        block = padded
+    return index, zlib.compress(np.ascontiguousarray(block), level)
+
+
+def _write_chunks(dataset, data, level, num_workers):
+    """ Compress chunks with zlib on a thread pool, write them raw."""
+    chunks = dataset.chunks
+    indices = itertools.product(
+        *[range(0, n, c) for n, c in zip(data.shape, chunks)]
+    )
+    compress = partial(
+        _compress_chunk, data, chunks=chunks, level=level
+    )
+    with ThreadPoolExecutor(num_workers) as pool:
+        # bound the number of compressed chunks waiting to be written
+        while True:
+            batch = list(itertools.islice(indices, 8 * num_workers))
+            if len(batch) == 0:
+                break
+            for index, chunk in pool.map(compress, batch):
+                dataset.id.write_direct_chunk(index, chunk)
+
+
+class _H5Options:
+    def __init__(
+        self, compression, chunks, min_compress_size, num_workers, ragged
+    ):
+        self.compression = compression
+        self.chunks = chunks
+        self.min_compress_size = min_compress_size
+        self.num_workers = num_workers
+        self.ragged = ragged
+
+    def get_codec(self, name):
+        if isinstance(self.compression, dict):
+            leaf = name.rsplit("/", 1)[-1]
+            codec = self.compression.get(
+                name, self.compression.get(leaf, "gzip")
+            )
+        else:
+            codec = self.compression
+        return _get_codec(codec)
+
+
+def _create_dataset(f, key, data, options):
+    kwargs, level = {}, -1
+    # scalar datasets support neither chunks nor filters
+    if data.ndim > 0:
+        if data.nbytes >= options.min_compress_size:
+            name = (f.name.rstrip("/") + "/" + key).lstrip("/")
+            kwargs, level = options.get_codec(name)
+        if kwargs or options.chunks is not None:
+            kwargs["chunks"] = _get_chunks(data.shape, options.chunks)
 
-    equal_length_arr = []
-    for arr in unequal_length_arr:
-        arr_fill = np.ones(shape_max) * PLACEHOLDER
-        if len(arr) != 0:
-            arr_fill[np.where(arr)] = np.array(arr).flatten()
-        equal_length_arr.append(arr_fill)
-    return np.array(equal_length_arr)
+    if level < 0 or options.num_workers <= 1:
+        f.create_dataset(key, data=data, **kwargs)
+        return
 
+    dataset = f.create_dataset(
+        key, shape=data.shape, dtype=data.dtype, **kwargs
+    )
+    _write_chunks(dataset, data, level, options.num_workers)
 
-def _generate_h5_file(f, key, data, compression='gzip'):
+
+def _generate_h5_file(f, key, data, options):
     if not isinstance(data, dict):
         if isinstance(data, list):
-            data = np.array(data)
+            try:
+                data = np.array(data)
+            except ValueError:  # unequal length elements
+                elements, data = data, np.empty(len(data), dtype=object)
+                for i, element in enumerate(elements):
+                    data[i] = element
         if isinstance(data, np.ndarray):
             if data.dtype.hasobject:
-                # 将变长list，填补为等长数组. list中矩阵的深度必须一致
-                data = __array_fill_in(data)
-            f.create_dataset(key, data=data, compression=compression)
+                # 变长list, 按ragged方式存储. list中矩阵的深度必须一致
+                arrays = _as_ragged(data)
+                if options.ragged == "flat":
+                    _write_ragged_flat(f, key, arrays, options)
+                    return
+                data = _fill_in(arrays)
+            _create_dataset(f, key, data, options)
         else:
             if isinstance(data, (np.str_, pydicom.uid.UID)):
                 data = str(data)
@@ -119,7 +446,14 @@ def _generate_h5_file(f, key, data, compression='gzip'):
         group = f.create_group(key)
         for k, v in data.items():
             if v is not None:
-                _generate_h5_file(group, k, v)
+                _generate_h5_file(group, k, v, options)
+
+
+def _read_h5_dataset(dataset: h5py.Dataset) -> Any:
+    value = dataset[()]
+    if isinstance(value, bytes):  # h5py >= 3 returns str as bytes
+        value = value.decode("utf-8")
+    return value
 
 
 def _get_h5_dict(f, new_dict=None):
@@ -127,37 +461,199 @@ def _get_h5_dict(f, new_dict=None):
         new_dict = {}
     for k, v in f.items():
         if type(v) is not h5py.Group:
-            new_dict[k] = v.value
+            new_dict[k] = _read_h5_dataset(v)
+        elif v.attrs.get("ragged") == "flat":
+            new_dict[k] = _read_ragged(v)
         else:
             new_dict[k] = _get_h5_dict(v)
     return new_dict
 
 
-def read_h5(data_path: Union[str, Path]) -> dict:
+class H5Dict(Mapping):
+    """ Read-only dict view of an open h5 file.
+
+    Nothing is read when the file is opened. Indexing a group returns
+    another H5Dict, indexing a scalar returns its value, indexing a ragged
+    array list returns the list, and indexing an array returns the
+    h5py.Dataset itself, so slicing it only reads the chunks it touches.
+
+    Example:
+    >>> import umtk
+    >>> with umtk.read_h5("volume.h5", lazy=True) as vtd:
+    >>>     spacing = vtd["spacing_zyx"][:]
+    >>>     slab = vtd["image_zyx"][z0:z1]
+
+    N.B.
+        Values can only be read while the file is open, close() (or
+        leaving the with block) closes the file of all nested H5Dicts.
+    """
+    def __init__(self, group: h5py.Group):
+        self.group = group
+
+    def __getitem__(self, key):
+        v = self.group[key]
+        if isinstance(v, h5py.Group):
+            if v.attrs.get("ragged") == "flat":
+                return _read_ragged(v)
+            return H5Dict(v)
+        if v.shape == ():
+            return _read_h5_dataset(v)
+        return v
+
+    def __iter__(self):
+        return iter(self.group.keys())
+
+    def __len__(self):
+        return len(self.group)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "H5Dict({!r})".format(list(self))
+
+    def close(self) -> None:
+        self.group.file.close()
+
+    def to_dict(self) -> dict:
+        """ Read everything into a plain dict, same as read_h5()."""
+        return _get_h5_dict(self.group)
+
+
+def read_h5(
+    data_path: Union[str, Path],
+    lazy: bool = False,
+) -> Union[dict, H5Dict]:
     """ Read an h5 format image as dict.
 
     Args:
         data_path: h5 image file path.
+        lazy: whether to return an H5Dict backed by the open file instead
+            of reading all datasets into memory.
 
     Returns:
         dict containing volume data, dicom tags and annotations.
 
     """
+    if lazy:
+        return H5Dict(h5py.File(data_path, 'r'))
+
     with h5py.File(data_path, 'r') as f:
         return _get_h5_dict(f)
 
 
-def write_h5(data_path: Union[str, Path], data_dict: dict, compression='gzip'):
+def write_h5(
+    data_path: Union[str, Path],
+    data_dict: dict,
+    compression: Union[str, None, Dict[str, Optional[str]]] = 'gzip',
+    chunks: Union[str, Tuple[int, ...], None] = None,
+    min_compress_size: int = 16384,
+    num_workers: int = 0,
+    ragged: str = "flat",
+):
     """ write dict as an h5 format image.
 
     Args:
         data_path: h5 image file path.
         data_dict: dict containing volume data, dicom tags and annotations.
-        compression: compression type.
+        compression: compression codec, one of "gzip[:level]" (level 0-9,
+            default 4), "lzf", "none" / None, and "blosc[:level]" or
+            "zstd[:level]" if hdf5plugin is installed (otherwise gzip is
+            used). A dict gives the codec per key, looked up by path in
+            the file (e.g. "annotations/boxes") then by key name, missing
+            keys use gzip.
+        chunks: chunk shape of arrays, "slice" for one chunk per 2D slice
+            (fast slice access), "patch" for 64^3 blocks (fast patch
+            access), a tuple, or None to let h5py choose.
+        min_compress_size: arrays smaller than this (in bytes) are stored
+            uncompressed.
+        num_workers: number of threads compressing gzip chunks in
+            parallel, 0 or 1 means compressing in h5py.
+        ragged: storage of lists of arrays with unequal shapes (e.g. boxes
+            or contours per slice). "flat" stores a flat values buffer
+            plus offsets and shapes, read back as the same list of arrays.
+            "pad" stores one array padded with NaN to the largest shape.
 
     Returns:
 
     """
+    assert ragged in ("flat", "pad")
+    options = _H5Options(
+        compression, chunks, min_compress_size, num_workers, ragged
+    )
     with h5py.File(data_path, 'w') as f:
         for k, v in data_dict.items():
-            _generate_h5_file(f, k, v, compression)
+            _generate_h5_file(f, k, v, options)
+
+
+# Benchmarks of peak memory of read_itk with and without zero-copy, and of
+# write_h5 / read_h5 throughput with different codecs and chunk shapes.
+if __name__ == "__main__":
+    import subprocess
+    import sys
+    import time
+
+    # peak RSS (VmHWM) increase while reading a volume, linux only
+    script = (
+        "import sys\n"
+        "from umtk.image.io import read_itk\n"
+        "def status(key):\n"
+        "    for line in open('/proc/self/status'):\n"
+        "        if line.startswith(key):\n"
+        "            return int(line.split()[1]) // 1024\n"
+        "open('/proc/self/clear_refs', 'w').write('5')\n"
+        "rss = status('VmRSS')\n"
+        "vtd = read_itk(sys.argv[1], zero_copy={}, keep_itk={})\n"
+        "print(status('VmHWM') - rss)\n"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "volume.mha")
+        image = np.zeros((400, 512, 512), dtype=np.int16)
+        SimpleITK.WriteImage(SimpleITK.GetImageFromArray(image), path)
+        print("volume size: {} MB".format(image.nbytes // 1024 ** 2))
+        del image
+
+        for zero_copy, keep_itk in ((False, True), (False, False),
+                                    (True, True)):
+            peak_rss = subprocess.check_output([
+                sys.executable, "-c", script.format(zero_copy, keep_itk),
+                path
+            ]).decode().strip()
+            print("zero_copy={:d} keep_itk={:d}: peak RSS {} MB".format(
+                zero_copy, keep_itk, peak_rss))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "volume.h5")
+        rng = np.random.RandomState(0)
+        image = rng.normal(0, 100, (200, 512, 512)).astype(np.int16)
+        image[:, :128] = -1024  # air
+        size_mb = image.nbytes / 1024 ** 2
+
+        for kwargs in (
+            {},
+            {"chunks": "slice"},
+            {"chunks": "slice", "num_workers": os.cpu_count()},
+            {"chunks": "slice", "compression": "gzip:1",
+             "num_workers": os.cpu_count()},
+            {"chunks": "slice", "compression": "lzf"},
+            {"chunks": "slice", "compression": "blosc"},
+            {"chunks": "slice", "compression": "none"},
+        ):
+            t_start = time.time()
+            write_h5(path, {"image_zyx": image}, **kwargs)
+            t_write = time.time() - t_start
+            t_start = time.time()
+            read_h5(path)
+            t_read = time.time() - t_start
+            with read_h5(path, lazy=True) as vtd:
+                t_start = time.time()
+                vtd["image_zyx"][100]
+                t_slice = time.time() - t_start
+            print("{}: write {:.0f} MB/s, read {:.0f} MB/s, slice {:.1f} ms, "
+                  "file {:.0f} MB".format(
+                      kwargs, size_mb / t_write, size_mb / t_read,
+                      t_slice * 1000, os.path.getsize(path) / 1024 ** 2))
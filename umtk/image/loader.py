@@ -0,0 +1,142 @@
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import partial
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+import umtk.error_handling as exc
+from .io import (
+    _CACHE_META_FILE,
+    read_h5,
+    read_itk,
+    read_npz,
+    read_volume_cache,
+)
+from .read_dicoms import read_dicoms
+from .scan_series import DicomSeries
+
+
+def read_volume(source: Any) -> Dict[str, Any]:
+    """ Read a volume from any supported source.
+
+    Args:
+        source: a DicomSeries, a dicom file list, a directory containing
+            dicoms, a volume cache directory (see write_volume_cache()),
+            or a h5 / npy / npz / itk format image path.
+
+    Returns:
+        dict containing volume data and dicom tags.
+    """
+    if isinstance(source, DicomSeries):
+        return source.load()
+    if isinstance(source, (list, tuple)):
+        return read_dicoms(source)
+    if os.path.isdir(source):
+        if os.path.isfile(os.path.join(source, _CACHE_META_FILE)):
+            return read_volume_cache(source)
+        return read_dicoms(source)
+
+    path = str(source).lower()
+    if path.endswith((".h5", ".hdf5")):
+        return read_h5(source)
+    if path.endswith((".npy", ".npz")):
+        return read_npz(source)
+    return read_itk(source)
+
+
+def _read(read: Callable[[Any], Dict[str, Any]], source: Any):
+    try:
+        return read(source)
+    except exc.BaseError as e:
+        return e
+    except Exception as e:
+        return exc.UnknownError(
+            "Failed to read volume [{}]: {!r}".format(source, e)
+        )
+
+
+def iter_volumes(
+    sources: Iterable[Any],
+    reader: Optional[Callable[[Any], Dict[str, Any]]] = None,
+    num_workers: int = 4,
+    prefetch: Optional[int] = None,
+    ordered: bool = True,
+    executor: Optional[Executor] = None,
+) -> Iterator[Tuple[Any, Any]]:
+    """ Read many volumes on a worker pool with bounded prefetch.
+
+    At most `prefetch` volumes are being read, waiting to be consumed or
+    being consumed at any time, a new read is only submitted when the
+    consumer asks for the next result.
+
+    Args:
+        sources: volume sources, see read_volume().
+        reader: function reading a source, default to read_volume().
+            Use functools.partial to pass options, e.g.
+            partial(umtk.read_dicoms, allow_missing_layers=True).
+        num_workers: number of threads, ignored if executor is given.
+        prefetch: maximum number of volumes in flight,
+            default to 2 * num_workers.
+        ordered: whether to yield results in the order of sources or as
+            soon as they are read.
+        executor: an existing thread / process pool.
+
+    Returns:
+        an iterator of (source, result) pairs. result is the volume dict,
+        or the umtk.BaseError raised when reading it (exceptions which are
+        not BaseError are wrapped in umtk.UnknownError), so that one bad
+        series does not stop the stream.
+
+    Example:
+    >>> import umtk
+    >>> for source, vtd in umtk.iter_volumes(paths, num_workers=8):
+    >>>     if isinstance(vtd, umtk.BaseError):
+    >>>         print(source, vtd.error_code)
+    >>>         continue
+    >>>     train_step(vtd["image_zyx"])
+    """
+    read = partial(_read, reader if reader is not None else read_volume)
+    prefetch = prefetch if prefetch is not None else 2 * num_workers
+    assert prefetch > 0
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(num_workers)
+
+    sources = iter(sources)
+    pending = deque() if ordered else {}
+    ready = deque()  # read (unordered) but not yielded yet
+
+    def submit():
+        for source in sources:
+            future = executor.submit(read, source)
+            if ordered:
+                pending.append((source, future))
+            else:
+                pending[future] = source
+            if len(pending) + len(ready) >= prefetch:
+                break
+
+    try:
+        submit()
+        while len(pending) + len(ready) != 0:
+            if ordered:
+                source, future = pending.popleft()
+            else:
+                if len(ready) == 0:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    ready.extend((pending.pop(f), f) for f in done)
+                source, future = ready.popleft()
+            yield source, future.result()
+            # refill only once the result is consumed
+            submit()
+    finally:
+        futures = pending if not ordered else [f for _, f in pending]
+        for future in futures:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
@@ -0,0 +1,119 @@
+from functools import partial
+from typing import Callable, Optional, Sequence
+import numpy as np
+from umtk.utils.multiprocess import run_in_slabs
+from .normalize import _clip_rescale, fast_percentile
+
+
+def _get_index(src: np.ndarray) -> np.ndarray:
+    """ View an integer image as unsigned, i.e. as indices into a LUT."""
+    return src.view(np.dtype("u{}".format(src.dtype.itemsize)))
+
+
+class IntensityLUT:
+    """ Lookup table of a chain of pointwise intensity transforms.
+
+    For 8 / 16 bits integer images there are at most 65536 distinct
+    intensities, so the chain is evaluated once over the whole range of the
+    dtype and then applied to a volume with a single gather per voxel.
+
+    Args:
+        funcs: pointwise intensity transforms applied in order, each taking
+            and returning an array, e.g. partial(umtk.normalize_fixed,
+            in_min=-100, in_max=400) or partial(umtk.gamma_transform,
+            gamma=0.5).
+        dtype: integer dtype of the images to be transformed.
+
+    Example:
+    >>> import umtk
+    >>> from functools import partial
+    >>> lut = umtk.IntensityLUT([
+    >>>     partial(umtk.normalize_fixed, in_min=-100, in_max=400),
+    >>>     partial(umtk.gamma_transform, gamma=0.5),
+    >>> ])
+    >>> img = lut(vtd["image_zyx"], num_threads=4)
+    """
+    def __init__(
+        self,
+        funcs: Sequence[Callable[[np.ndarray], np.ndarray]] = (),
+        dtype=np.int16,
+        table: Optional[np.ndarray] = None,
+    ):
+        self.dtype = np.dtype(dtype)
+        assert self.dtype.kind in "iu" and self.dtype.itemsize <= 2
+
+        if table is None:
+            # table[i] is the image of the intensity whose bits are i
+            table = np.arange(
+                2 ** (8 * self.dtype.itemsize),
+                dtype=_get_index(np.empty(0, self.dtype)).dtype
+            ).view(self.dtype)
+        for func in funcs:
+            table = func(table)
+        self.table = np.ascontiguousarray(table)
+
+    def then(
+        self, *funcs: Callable[[np.ndarray], np.ndarray]
+    ) -> "IntensityLUT":
+        """ Compose this table with more transforms into a new table."""
+        return IntensityLUT(funcs, self.dtype, self.table)
+
+    def __call__(
+        self,
+        src: np.ndarray,
+        out: Optional[np.ndarray] = None,
+        num_threads: int = 1,
+    ) -> np.ndarray:
+        """ Transform an image.
+
+        Args:
+            src: image of the dtype of the table.
+            out: output array of the same shape and of the dtype of the
+                table. If None, a new array is allocated.
+            num_threads: number of threads processing z-slabs in parallel,
+                None means all available cores.
+
+        Return:
+            the transformed image.
+        """
+        assert src.dtype == self.dtype
+        if out is None:
+            out = np.empty(src.shape, dtype=self.table.dtype)
+        assert out.shape == src.shape and out.dtype == self.table.dtype
+
+        index = _get_index(src)
+
+        # indices are always in range, mode="clip" avoids buffering out
+        def run(start, stop):
+            np.take(self.table, index[start:stop], out=out[start:stop],
+                    mode="clip")
+
+        run_in_slabs(run, len(src), num_threads)
+        return out
+
+
+def get_imadjust_transform(
+    src: np.ndarray,
+    low_pct: float = 1.,
+    high_pct: float = 99.,
+    num_threads: int = 1,
+) -> Callable[[np.ndarray], np.ndarray]:
+    """ Get imadjust() of an image as a pointwise transform.
+
+    imadjust() depends on the percentiles of the image, once they are known
+    it is a pointwise mapping which can be put in an IntensityLUT.
+
+    Args:
+        src: image to be enhanced.
+        low_pct: low bound.
+        high_pct: high bound.
+        num_threads: number of threads computing the percentiles.
+
+    Return:
+        the transform, same as imadjust(src, low_pct, high_pct) when applied
+        to src.
+    """
+    low_thr, high_thr = fast_percentile(
+        src, (low_pct, high_pct), num_threads=num_threads
+    )
+    return partial(_clip_rescale, low_thr=low_thr, high_thr=high_thr)
@@ -0,0 +1,236 @@
+from typing import List, Tuple
+import numpy as np
+from scipy import ndimage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from umtk.utils.backend import is_cupy_array
+from umtk.utils.multiprocess import run_in_slabs
+
+
+def _check_dtype_supported(ar):
+    if not (ar.dtype == bool or np.issubdtype(ar.dtype, np.integer)):
+        raise TypeError(
+            "Only bool or integer types are supported. Got %s." % ar.dtype
+        )
+
+
+def _label(mask: np.ndarray, num_threads: int):
+    """ Label the (face) connected components of a binary mask.
+
+    Z-slabs are labeled in parallel, then components touching across slab
+    boundaries are merged.
+
+    Returns:
+        labels: labels of each slab, numbered from 1 in each slab.
+        slabs: (start, stop, offset) of each slab, offset + label is the
+            global label of a component of the slab.
+        components: (N + 1,) component of each global label (0 for
+            background), components are numbered from 1.
+        sizes: (num_components + 1,) number of voxels of each component.
+    """
+    labels = np.empty(mask.shape, dtype=np.int32)
+
+    def label(start, stop):
+        num = ndimage.label(mask[start:stop], output=labels[start:stop])
+        sizes = np.bincount(labels[start:stop].ravel(), minlength=num + 1)
+        return start, stop, num, sizes[1:]
+
+    results = run_in_slabs(label, len(mask), num_threads)
+    offsets = np.cumsum([0] + [num for _, _, num, _ in results])
+    slabs = [
+        (start, stop, offset)
+        for (start, stop, _, _), offset in zip(results, offsets)
+    ]
+    label_sizes = np.concatenate(
+        [np.zeros(1, dtype=np.int64)] + [sizes for *_, sizes in results]
+    )
+
+    # components connected by voxels facing each other across a boundary
+    edges = []
+    for (_, stop, offset), (_, _, next_offset) in zip(slabs, slabs[1:]):
+        a, b = labels[stop - 1], labels[stop]
+        touching = (a > 0) & (b > 0)
+        edges.append(np.stack([
+            a[touching].astype(np.int64) + offset,
+            b[touching].astype(np.int64) + next_offset,
+        ]))
+    num_labels = int(offsets[-1]) + 1
+    if edges and sum(e.shape[1] for e in edges) > 0:
+        edges = np.concatenate(edges, axis=1)
+        graph = coo_matrix(
+            (np.ones(edges.shape[1], dtype=bool), (edges[0], edges[1])),
+            shape=(num_labels, num_labels)
+        )
+        _, components = connected_components(graph, directed=False)
+        # renumber so that background is 0 and components start from 1
+        components = np.where(
+            components == components[0], 0,
+            components + (components < components[0])
+        )
+    else:
+        components = np.arange(num_labels)
+    sizes = np.bincount(components, weights=label_sizes).astype(np.int64)
+    return labels, slabs, components, sizes
+
+
+def _get_labels(mask: np.ndarray, num_threads: int):
+    """ Same as _label() for a binary mask, a labeled mask is used as is."""
+    if mask.dtype == bool:
+        return _label(mask, num_threads)
+
+    counts = run_in_slabs(
+        lambda start, stop: np.bincount(mask[start:stop].ravel()),
+        len(mask), num_threads
+    )
+    sizes = np.zeros(max(len(c) for c in counts), dtype=np.int64)
+    for c in counts:
+        sizes[:len(c)] += c
+    return mask, [(0, len(mask), 0)], np.arange(len(sizes)), sizes
+
+
+def _remove(
+    mask: np.ndarray,
+    labels: np.ndarray,
+    slabs: List[Tuple[int, int, int]],
+    removed: np.ndarray,
+    num_threads: int,
+) -> None:
+    """ Set voxels of removed global labels to 0, slab by slab."""
+    def remove(start, stop):
+        for slab_start, slab_stop, offset in slabs:
+            lo, hi = max(start, slab_start), min(stop, slab_stop)
+            if lo < hi:
+                table = removed[offset:].copy()
+                table[0] = False
+                mask[lo:hi][table[labels[lo:hi]]] = 0
+
+    run_in_slabs(remove, len(mask), num_threads)
+
+
+def remove_small_objects(
+    mask: np.ndarray,
+    min_size: int,
+    num_threads: int = 1,
+) -> None:
+    """ See scikit-image remove_small_objects()
+
+    N.B.
+        Input array can be a binary mask (bool type) or
+        labeled mask (int type).
+        This is a inplace operation.
+
+    Args:
+        num_threads: number of threads processing z-slabs in parallel,
+            None means all available cores (ignored for cupy arrays, which
+            are processed by remove_small_objects_gpu()).
+    """
+    if is_cupy_array(mask):
+        from umtk.cupy_utils.morphology import remove_small_objects_gpu
+        return remove_small_objects_gpu(mask, min_size)
+
+    _check_dtype_supported(mask)
+
+    labels, slabs, components, sizes = _get_labels(mask, num_threads)
+    too_small = sizes < min_size
+    _remove(mask, labels, slabs, too_small[components], num_threads)
+
+
+def keep_largest_connected_component(
+    mask: np.ndarray,
+    num_threads: int = 1,
+) -> None:
+    """ Keep the largest connected component.
+
+    Remove small connected components, only keep the largest
+    connected component (excluding background).
+
+    N.B.
+        Input array can be a binary mask (bool type) or
+        labeled mask (int type).
+
+        This is a inplace operation.
+
+    Args:
+        num_threads: number of threads processing z-slabs in parallel,
+            None means all available cores (ignored for cupy arrays, which
+            are processed by keep_largest_connected_component_gpu()).
+    """
+    if is_cupy_array(mask):
+        from umtk.cupy_utils.morphology import (
+            keep_largest_connected_component_gpu
+        )
+        return keep_largest_connected_component_gpu(mask)
+
+    _check_dtype_supported(mask)
+    labels, slabs, components, sizes = _get_labels(mask, num_threads)
+    if len(sizes) == 1:  # just background
+        return
+    largest_cc_index = np.argmax(sizes[1:]) + 1
+    _remove(
+        mask, labels, slabs, components != largest_cc_index, num_threads
+    )
+
+
+def remove_small_holes(
+    mask: np.ndarray,
+    area_threshold: int,
+    num_threads: int = 1,
+) -> None:
+    """ See scikit-image remove_small_holes()
+
+    N.B.
+        Input array must be a binary mask (bool type) or
+        labeled mask (int type).
+        This is a inplace operation.
+
+    Args:
+        num_threads: number of threads processing z-slabs in parallel,
+            None means all available cores (ignored for cupy arrays, which
+            are processed by remove_small_holes_gpu()).
+    """
+    if is_cupy_array(mask):
+        from umtk.cupy_utils.morphology import remove_small_holes_gpu
+        return remove_small_holes_gpu(mask, area_threshold)
+
+    _check_dtype_supported(mask)
+
+    np.logical_not(mask, out=mask)
+    remove_small_objects(mask, area_threshold, num_threads)
+    np.logical_not(mask, out=mask)
+
+
+if __name__ == "__main__":
+    import os
+    import time
+
+    # 512^3 blobby mask, compared with scikit-image (if installed)
+    rng = np.random.RandomState(0)
+    noise = rng.rand(512, 512, 512).astype(np.float32)
+    mask = ndimage.uniform_filter(noise, 5) > 0.52
+    del noise
+
+    try:
+        from skimage import morphology
+    except ImportError:
+        morphology = None
+
+    for name, func, naive in (
+        ("remove_small_objects", lambda m, **kw: remove_small_objects(
+            m, 64, **kw), lambda m: morphology.remove_small_objects(
+            m, 64)),
+        ("remove_small_holes", lambda m, **kw: remove_small_holes(
+            m, 64, **kw), lambda m: morphology.remove_small_holes(
+            m, 64)),
+    ):
+        for num_threads in (1, os.cpu_count()):
+            m = mask.copy()
+            tic = time.perf_counter()
+            func(m, num_threads=num_threads)
+            print("{} num_threads={}: {:.3f}s".format(
+                name, num_threads, time.perf_counter() - tic))
+        if morphology is not None:
+            m = mask.copy()
+            tic = time.perf_counter()
+            naive(m)
+            print("skimage {}: {:.3f}s".format(
+                name, time.perf_counter() - tic))
@@ -1,10 +1,33 @@
+from typing import Optional
 import numpy as np
+from umtk.utils.multiprocess import run_in_slabs
+
+
+def _get_out(src: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    if out is None:
+        return np.empty(src.shape, dtype=np.float32)
+    assert out.shape == src.shape and out.dtype == np.float32
+    return out
+
+
+def _run_in_slabs(func, src, num_threads):
+    """ Call func(index) on z-slabs src[index] in parallel, see
+    run_in_slabs(). A 0-d src has no slabs and is processed whole
+    (index=Ellipsis).
+    """
+    if src.ndim == 0:
+        return [func(...)]
+    return run_in_slabs(
+        lambda start, stop: func(slice(start, stop)), len(src), num_threads
+    )
 
 
 def normalize_mean_std(
     img: np.ndarray,
     mean: float,
-    std: float
+    std: float,
+    out: Optional[np.ndarray] = None,
+    num_threads: int = 1,
 ) -> np.ndarray:
     """ Normalize a tensor image with mean and standard deviation.
 
@@ -12,6 +35,10 @@ def normalize_mean_std(
         img: image to be normalized.
         mean: mean.
         std: standard deviation.
+        out: float32 output array of the same shape, may be img itself
+            (in-place). If None, a new array is allocated.
+        num_threads: number of threads processing z-slabs in parallel,
+            None means all available cores.
 
     Returns:
         normalized image of type np.float32.
@@ -21,40 +48,91 @@ def normalize_mean_std(
 
     denominator = np.reciprocal(std, dtype=np.float32)
 
-    img = img.astype(np.float32)
-    img -= mean
-    img *= denominator
+    out = _get_out(img, out)
+
+    def run(index):
+        dst = out[index]
+        np.subtract(img[index], mean, out=dst, casting="unsafe")
+        dst *= denominator
 
-    return img
+    _run_in_slabs(run, img, num_threads)
+    return out
 
 
-def normalize_adaptive(src: np.ndarray) -> np.ndarray:
+def normalize_adaptive(
+    src: np.ndarray,
+    out: Optional[np.ndarray] = None,
+    num_threads: int = 1,
+) -> np.ndarray:
     """ Rescale image intensity.
 
     Rescale an grayscale image's intensity range to [0.0, 1.0].
 
     Args:
         src: image to be intensity rescaled.
+        out: float32 output array of the same shape, may be src itself
+            (in-place). If None, a new array is allocated.
+        num_threads: number of threads processing z-slabs in parallel,
+            None means all available cores.
 
     Return:
         intensity rescaled image of type np.float32.
     """
     epsilon = 0.00001
 
-    src_float = src.astype(np.float32)
+    min_max = _run_in_slabs(
+        lambda index: (np.min(src[index]), np.max(src[index])),
+        src, num_threads
+    )
+    min_val = np.float32(min(x[0] for x in min_max))
+    max_val = np.float32(max(x[1] for x in min_max))
+    if max_val - min_val < epsilon:
+        max_val += epsilon
+
+    return _rescale(src, min_val, max_val - min_val, out, num_threads)
 
-    min_val, max_val = np.min(src_float), np.max(src_float)
+
+def _rescale(src, offset, scale, out, num_threads, clip=None):
+    """ Compute (clip(src) - offset) / scale slab by slab in a single pass.
+    """
+    out = _get_out(src, out)
+
+    def run(index):
+        dst = out[index]
+        if clip is not None:
+            np.clip(src[index], *clip, out=dst, casting="unsafe")
+            dst -= offset
+        else:
+            np.subtract(src[index], offset, out=dst, casting="unsafe")
+        dst /= scale
+
+    _run_in_slabs(run, src, num_threads)
+    return out
+
+
+def _clip_rescale(src, low_thr, high_thr, out=None, num_threads=1):
+    """ Clip src to [low_thr, high_thr] and rescale it to [0, 1], the
+    intensity mapping of imadjust().
+    """
+    # the clipped image ranges from low_thr to high_thr, so clipping and
+    # rescaling (normalize_adaptive) fuse into a single pass
+    epsilon = 0.00001
+    min_val, max_val = np.float32(low_thr), np.float32(high_thr)
     if max_val - min_val < epsilon:
         max_val += epsilon
 
-    dst = (src_float - min_val) / (max_val - min_val)
-    return dst
+    return _rescale(
+        src, min_val, max_val - min_val, out, num_threads,
+        clip=(low_thr, high_thr)
+    )
 
 
 def normalize_fixed(
     src: np.ndarray,
     in_min: float,
-    in_max: float
+    in_max: float,
+    out: Optional[np.ndarray] = None,
+    num_threads: int = 1,
 ) -> np.ndarray:
     """ Rescale image intensity.
 
@@ -65,25 +143,102 @@ def normalize_fixed(
         src: image to be intensity rescaled.
         in_min: input min value for intensity mapping
         in_max: input max value for intensity mapping
+        out: float32 output array of the same shape, may be src itself
+            (in-place). If None, a new array is allocated.
+        num_threads: number of threads processing z-slabs in parallel,
+            None means all available cores.
 
     Return:
         intensity rescaled image of type np.float32.
     """
     assert in_min < in_max
 
-    src = src.clip(in_min, in_max)
-    src_float = src.astype(np.float32)
-
     a = 1. / (in_max - in_min)
     b = -in_min / (in_max - in_min)
-    dst = a * src_float + b
-    return dst
+    out = _get_out(src, out)
+
+    def run(index):
+        dst = out[index]
+        np.clip(src[index], in_min, in_max, out=dst, casting="unsafe")
+        dst *= a
+        dst += b
+
+    _run_in_slabs(run, src, num_threads)
+    return out
+
+
+# number of voxels converted to bin indices at a time by
+# _histogram_percentile()
+_HISTOGRAM_CHUNK_SIZE = 1 << 20
+
+
+def _histogram_percentile(src, q, num_threads):
+    """ Exact percentiles of an (at most) 16 bits integer image computed
+    from its histogram, same as np.percentile(..., interpolation="linear").
+    """
+    low = np.iinfo(src.dtype).min
+    num_bins = np.iinfo(src.dtype).max - low + 1
+
+    def count(index):
+        slab = src[index]
+        if slab.ndim < 2:
+            slab = slab.reshape(-1, 1)
+        counts = np.zeros(num_bins, dtype=np.int64)
+        # bin indices of a few slices at a time, whatever the slab size
+        step = max(1, _HISTOGRAM_CHUNK_SIZE // max(1, slab[0:1].size))
+        for start in range(0, len(slab), step):
+            values = slab[start:start + step].astype(np.intp).ravel()
+            values -= low
+            counts += np.bincount(values, minlength=num_bins)
+        return counts
+
+    cumsum = np.cumsum(sum(_run_in_slabs(count, src, num_threads)))
+    positions = np.asarray(q, dtype=np.float64) / 100 * (cumsum[-1] - 1)
+    k = np.floor(positions)
+    value_k = np.searchsorted(cumsum, k, side="right")
+    value_k1 = np.searchsorted(
+        cumsum, np.minimum(k + 1, cumsum[-1] - 1), side="right"
+    )
+    return low + value_k + (value_k1 - value_k) * (positions - k)
+
+
+def fast_percentile(
+    src: np.ndarray,
+    q,
+    max_samples: int = 1000000,
+    num_threads: int = 1,
+) -> np.ndarray:
+    """ Compute percentiles in O(N) without copying the image.
+
+    Percentiles of 8 / 16 bits integer images (e.g. int16 CT) are exact and
+    computed from the histogram of intensities. Percentiles of other images
+    are approximated on a regular subsample of at most max_samples voxels.
+
+    Args:
+        src: image.
+        q: percentile or sequence of percentiles, in [0, 100].
+        max_samples: maximum number of voxels used by the approximation.
+        num_threads: number of threads computing histograms of z-slabs in
+            parallel, None means all available cores.
+
+    Return:
+        the percentiles, same as np.percentile(src, q) up to approximation.
+    """
+    if src.dtype.kind in "iu" and src.dtype.itemsize <= 2:
+        return _histogram_percentile(src, q, num_threads)
+
+    flat = src.reshape(-1)  # a view if src is contiguous
+    step = max(1, flat.size // max_samples)
+    return np.percentile(flat[::step], q)
 
 
 def imadjust(
     src: np.ndarray,
     low_pct: float = 1.,
     high_pct: float = 99.,
+    method: str = "exact",
+    out: Optional[np.ndarray] = None,
+    num_threads: int = 1,
 ) -> np.ndarray:
     """ Increase image contrast.
 
@@ -94,11 +249,23 @@ def imadjust(
         src: image to be enhanced.
         low_pct: low bound.
         high_pct: high bound.
+        method: how to compute percentiles, "exact" uses np.percentile,
+            "histogram" uses fast_percentile() (exact for 8 / 16 bits
+            integer images).
+        out: float32 output array of the same shape, may be src itself
+            (in-place). If None, a new array is allocated.
+        num_threads: number of threads processing z-slabs in parallel,
+            None means all available cores.
 
     Return:
         the enhanced image of type np.float32.
     """
-    low_thr, high_thr = np.percentile(src, (low_pct, high_pct))
-    dst = np.clip(src, a_min=low_thr, a_max=high_thr)
-    dst = normalize_adaptive(dst)
-    return dst
+    assert method in ("exact", "histogram")
+    if method == "exact":
+        low_thr, high_thr = np.percentile(src, (low_pct, high_pct))
+    else:
+        low_thr, high_thr = fast_percentile(
+            src, (low_pct, high_pct), num_threads=num_threads
+        )
+
+    return _clip_rescale(src, low_thr, high_thr, out, num_threads)
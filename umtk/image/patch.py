@@ -0,0 +1,186 @@
+from typing import Optional, Sequence, Tuple
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from .geometry import crop
+
+
+def _get_axis_starts(n: int, p: int, s: int) -> np.ndarray:
+    if n <= p:
+        return np.zeros(1, dtype=np.int64)
+    starts = np.arange(0, n - p + 1, s)
+    if starts[-1] != n - p:  # shift the last patch to the border
+        starts = np.append(starts, n - p)
+    return starts
+
+
+def get_patch_starts(
+    shape: Tuple[int, int, int],
+    patch_size: Tuple[int, int, int],
+    stride: Tuple[int, int, int],
+) -> np.ndarray:
+    """ Get the start points of a grid of patches covering an image.
+
+    Patches are placed every stride voxels, the last patch along each axis
+    is shifted back to end at the border, so no padding is needed unless
+    the image is smaller than a patch.
+
+    Args:
+        shape: image size (in pixel) in DHW order.
+        patch_size: patch size in DHW order.
+        stride: distance between neighbouring patches in DHW order.
+
+    Returns:
+        start points (N, 3) of the patches, in z-major order.
+    """
+    axes = [
+        _get_axis_starts(n, p, s)
+        for n, p, s in zip(shape, patch_size, stride)
+    ]
+    grid = np.meshgrid(*axes, indexing="ij")
+    return np.stack(grid, axis=-1).reshape(-1, 3)
+
+
+def extract_patches(
+    img: np.ndarray,
+    starts: np.ndarray,
+    patch_size: Tuple[int, int, int],
+    pad_value: float = 0,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """ Gather patches of an image into a single batch array.
+
+    Args:
+        img: image (D, H, W).
+        starts: start points (N, 3) of the patches, e.g. get_patch_starts().
+        patch_size: patch size in DHW order.
+        pad_value: value of the voxels of a patch outside the image.
+        out: output array (N,) + patch_size of the type of img. If None, a
+            new array is allocated.
+
+    Returns:
+        the patches (N,) + patch_size.
+    """
+    shape = (len(starts),) + tuple(patch_size)
+    if out is None:
+        out = np.empty(shape, dtype=img.dtype)
+    assert out.shape == shape
+
+    for patch, start in zip(out, starts):
+        src = crop(img, start, patch_size)
+        if src.shape != patch.shape:
+            patch.fill(pad_value)
+        patch[tuple(slice(0, n) for n in src.shape)] = src
+    return out
+
+
+def get_sliding_windows(
+    img: np.ndarray,
+    patch_size: Tuple[int, int, int],
+    stride: Tuple[int, int, int],
+    pad_value: float = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Get all patches of a regular grid as a single strided view.
+
+    If the grid does not exactly tile the image, the image is padded at the
+    end of each axis (the only copy made), otherwise the patches are a
+    zero-copy view of img. The view is read-only as patches overlap.
+
+    Args:
+        img: image (D, H, W).
+        patch_size: patch size in DHW order.
+        stride: distance between neighbouring patches in DHW order.
+        pad_value: value of the padded voxels.
+
+    Returns:
+        patches (GD, GH, GW) + patch_size where patches[i, j, k] starts at
+        starts[i, j, k] (GD, GH, GW, 3).
+
+    Example:
+    >>> import umtk
+    >>> patches, starts = umtk.get_sliding_windows(img, (64,) * 3, (32,) * 3)
+    >>> for index in np.ndindex(patches.shape[:3]):
+    >>>     pred = model(patches[index])
+    """
+    grid, pad_width = [], []
+    for n, p, s in zip(img.shape, patch_size, stride):
+        g = max(0, -(-(n - p) // s)) + 1  # ceil
+        grid.append(g)
+        pad_width.append((0, (g - 1) * s + p - n))
+    if any(after > 0 for _, after in pad_width):
+        img = np.pad(
+            img, pad_width, mode="constant", constant_values=pad_value
+        )
+
+    patches = as_strided(
+        img,
+        shape=tuple(grid) + tuple(patch_size),
+        strides=tuple(
+            st * s for st, s in zip(img.strides, stride)
+        ) + img.strides,
+        writeable=False
+    )
+    starts = np.stack(np.meshgrid(
+        *[np.arange(g) * s for g, s in zip(grid, stride)], indexing="ij"
+    ), axis=-1)
+    return patches, starts
+
+
+class PatchStitcher:
+    """ Reassemble patch predictions into a volume, averaging overlaps.
+
+    Args:
+        shape: output size, spatial axes last, e.g. (D, H, W) or
+            (C, D, H, W) for multi-channel predictions.
+        out: preallocated float output array of the given shape, the sums
+            of predictions are accumulated in it. If None, a float32 array
+            is allocated.
+
+    Example:
+    >>> import umtk
+    >>> starts = umtk.get_patch_starts(img.shape, (64,) * 3, (32,) * 3)
+    >>> stitcher = umtk.PatchStitcher(img.shape)
+    >>> for i in range(0, len(starts), 16):
+    >>>     patches = umtk.extract_patches(img, starts[i:i + 16], (64,) * 3)
+    >>>     stitcher.add(model(patches), starts[i:i + 16])
+    >>> pred = stitcher.result()
+    """
+    def __init__(
+        self,
+        shape: Sequence[int],
+        out: Optional[np.ndarray] = None,
+    ):
+        if out is None:
+            out = np.zeros(shape, dtype=np.float32)
+        else:
+            assert out.shape == tuple(shape)
+            out.fill(0)
+        self.out = out
+        self.counts = np.zeros(shape[-3:], dtype=np.float32)
+
+    def add(self, patches: np.ndarray, starts: np.ndarray) -> None:
+        """ Add predictions of patches.
+
+        Args:
+            patches: predictions (N, ...) + patch_size, the voxels outside
+                the output are ignored.
+            starts: start points (N, 3) of the patches.
+        """
+        for patch, start in zip(patches, starts):
+            size = patch.shape[-3:]
+            counts = crop(self.counts, start, size)
+            region = (Ellipsis,) + tuple(slice(0, n) for n in counts.shape)
+            crop_out = self.out[(Ellipsis,) + tuple(
+                slice(z, z + d) for z, d in zip(start, size)
+            )]
+            crop_out += patch[region]
+            counts += 1
+
+    def result(self) -> np.ndarray:
+        """ Get the averaged predictions (in out), voxels not covered by any
+        patch are 0.
+        """
+        np.divide(
+            self.out, np.maximum(self.counts, 1), out=self.out,
+            casting="unsafe"
+        )
+        return self.out
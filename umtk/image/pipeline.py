@@ -0,0 +1,431 @@
+from collections import namedtuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from .functional import gamma_transform
+from .geometry import _resize, _torch_num_threads, crop, flip
+from .lut import IntensityLUT
+from .normalize import normalize_fixed, normalize_mean_std
+
+
+_Flip = namedtuple("_Flip", ["axes"])
+_Crop = namedtuple("_Crop", ["start", "size"])
+_Resize = namedtuple("_Resize", ["in_shape", "size", "mode", "to_float"])
+_Pointwise = namedtuple("_Pointwise", ["name", "func", "apply"])
+
+
+class _View:
+    """ Planned stage: flips and crops applied as a single strided view."""
+    def __init__(self, ops):
+        self.ops = ops
+
+
+class _Fused:
+    """ Planned stage: fused intensity transforms."""
+    def __init__(self, ops):
+        self.ops = ops
+        self.dtypes = []
+        self.lut = None
+
+
+# a LUT is worth building when the image is much larger than the table
+_MIN_LUT_RATIO = 8
+
+
+def _get_shape(op, shape):
+    if isinstance(op, _Crop):
+        return tuple(op.size)
+    if isinstance(op, _Resize):
+        return tuple(op.size)
+    return shape
+
+
+def _push_crop(resize_op: _Resize, crop_op: _Crop) -> Optional[_Crop]:
+    """ Get the crop of the input of a nearest resize equivalent to a crop
+    of its output, None if there is no exact one.
+    """
+    if resize_op.mode != "nearest":
+        return None
+
+    start, size = [], []
+    for n_in, n_out, z, d in zip(
+        resize_op.in_shape, resize_op.size, crop_op.start, crop_op.size
+    ):
+        if n_in % n_out == 0:  # down-sampling by an integer factor
+            k = n_in // n_out
+            start.append(z * k)
+            size.append(d * k)
+        elif n_out % n_in == 0:  # up-sampling by an integer factor
+            k = n_out // n_in
+            if z % k != 0 or d % k != 0:
+                return None
+            start.append(z // k)
+            size.append(d // k)
+        else:
+            return None
+    return _Crop(tuple(start), tuple(size))
+
+
+def _swap(a, b):
+    """ Get ops equivalent to a then b with b moved ahead, None if they can
+    not be exchanged (or it is not worth it).
+    """
+    if isinstance(a, _Pointwise) and isinstance(b, (_Flip, _Crop)):
+        return [b, a]
+
+    if isinstance(a, _Resize) and isinstance(b, _Crop):
+        crop_op = _push_crop(a, b)
+        if crop_op is not None:
+            return [crop_op, a._replace(in_shape=crop_op.size, size=b.size)]
+
+    if (isinstance(a, _Pointwise) and isinstance(b, _Resize)
+            and b.mode == "nearest" and not b.to_float
+            and np.prod(b.size) < np.prod(b.in_shape)):
+        return [b, a]
+
+    return None
+
+
+class Pipeline:
+    """ Preprocessing pipeline of umtk.image operations.
+
+    Operations are recorded by chaining methods, then planned once per input
+    shape / dtype / orientation before anything runs:
+
+    - flips and crops are merged into a single strided view and moved ahead
+      of intensity transforms, crops are also moved ahead of nearest resizes
+      when the result is exactly the same, so fewer voxels are processed;
+    - nearest down-sampling is moved ahead of intensity transforms;
+    - consecutive intensity transforms are fused, they write into a single
+      buffer, or become a single lookup table gather on 8 / 16 bits images.
+
+    Intermediate buffers are reused across runs (per thread). The time
+    spent in each planned stage is accumulated in timings.
+
+    Args:
+        num_threads: number of threads of the intensity transforms and
+            resizes, None means all available cores (intensity transforms)
+            or the default of torch (resizes).
+
+    Example:
+    >>> import umtk
+    >>> pipeline = (
+    >>>     umtk.Pipeline()
+    >>>     .reorient()
+    >>>     .center_crop((128, 256, 256))
+    >>>     .resize((64, 128, 128), mode="nearest")
+    >>>     .normalize_fixed(-100, 400)
+    >>>     .gamma_transform(0.5)
+    >>> )
+    >>> img = pipeline(vtd)
+    >>> imgs = pipeline.run_batch(vtds, num_workers=4)
+    >>> print(pipeline.timings)
+    """
+    def __init__(self, num_threads: int = 1):
+        self.num_threads = num_threads
+        self.timings = {}
+        self._ops = []
+        self._plans = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _add(self, *op) -> "Pipeline":
+        self._ops.append(op)
+        self._plans = {}
+        return self
+
+    def reorient(self) -> "Pipeline":
+        """ Flip axes whose direction is negative, like get_reorient_image().
+        """
+        return self._add("reorient")
+
+    def flip(self, axes: Sequence[int]) -> "Pipeline":
+        return self._add("flip", tuple(axes))
+
+    def crop(
+        self,
+        start_point: Tuple[int, int, int],
+        crop_size: Tuple[int, int, int]
+    ) -> "Pipeline":
+        return self._add("crop", tuple(start_point), tuple(crop_size))
+
+    def center_crop(self, crop_size: Tuple[int, int, int]) -> "Pipeline":
+        return self._add("center_crop", tuple(crop_size))
+
+    def resize(
+        self,
+        size: Tuple,
+        to_float: bool = False,
+        mode: str = "trilinear"
+    ) -> "Pipeline":
+        assert mode in ("nearest", "trilinear")
+        return self._add("resize", tuple(size), mode, to_float)
+
+    def normalize_fixed(self, in_min: float, in_max: float) -> "Pipeline":
+        return self._add("pointwise", _Pointwise(
+            "normalize_fixed",
+            partial(normalize_fixed, in_min=in_min, in_max=in_max),
+            lambda src, out, n: normalize_fixed(
+                src, in_min, in_max, out=out, num_threads=n
+            )
+        ))
+
+    def normalize_mean_std(self, mean: float, std: float) -> "Pipeline":
+        return self._add("pointwise", _Pointwise(
+            "normalize_mean_std",
+            partial(normalize_mean_std, mean=mean, std=std),
+            lambda src, out, n: normalize_mean_std(
+                src, mean, std, out=out, num_threads=n
+            )
+        ))
+
+    def gamma_transform(self, gamma: float) -> "Pipeline":
+        return self._add("pointwise", _Pointwise(
+            "gamma_transform",
+            partial(gamma_transform, gamma=gamma),
+            lambda src, out, n: np.power(src, gamma, out=out)
+        ))
+
+    def _resolve(self, shape, direction_zyx):
+        """ Get the primitive ops applied to an image of the given shape."""
+        ops = []
+        for op in self._ops:
+            kind = op[0]
+            if kind == "reorient":
+                assert direction_zyx is not None, "reorient needs a direction"
+                axes = tuple(np.where(np.asarray(direction_zyx) < 0)[0])
+                new_op = _Flip(axes) if axes else None
+            elif kind == "flip":
+                new_op = _Flip(op[1]) if op[1] else None
+            elif kind == "crop":
+                new_op = _Crop(op[1], op[2])
+            elif kind == "center_crop":
+                start = tuple((n - c) // 2 for n, c in zip(shape, op[1]))
+                new_op = _Crop(start, op[1])
+            elif kind == "resize":
+                new_op = _Resize(shape, op[1], op[2], op[3])
+            else:
+                new_op = op[1]
+
+            if new_op is not None:
+                ops.append(new_op)
+                shape = _get_shape(new_op, shape)
+        return ops
+
+    def _plan(self, shape, dtype, direction_zyx):
+        key = (shape, dtype, None if direction_zyx is None else
+               tuple(np.asarray(direction_zyx) < 0))
+        plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+
+        ops = self._resolve(shape, direction_zyx)
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(ops) - 1):
+                swapped = _swap(ops[i], ops[i + 1])
+                if swapped is not None:
+                    ops[i:i + 2] = swapped
+                    changed = True
+
+        plan = []
+        for op in ops:
+            if isinstance(op, (_Flip, _Crop)):
+                if plan and isinstance(plan[-1], _View):
+                    plan[-1].ops.append(op)
+                else:
+                    plan.append(_View([op]))
+            elif isinstance(op, _Pointwise):
+                if plan and isinstance(plan[-1], _Fused):
+                    plan[-1].ops.append(op)
+                else:
+                    plan.append(_Fused([op]))
+            else:
+                plan.append(op)
+
+        # infer the dtype after each intensity transform, build a lookup
+        # table when the input of the transforms is a 8 / 16 bits image
+        for stage in plan:
+            if isinstance(stage, _View):
+                for op in stage.ops:
+                    shape = _get_shape(op, shape)
+            elif isinstance(stage, _Fused):
+                num_bins = 256 ** dtype.itemsize
+                if (dtype.kind in "iu" and dtype.itemsize <= 2 and
+                        np.prod(shape) > _MIN_LUT_RATIO * num_bins):
+                    stage.lut = IntensityLUT(
+                        [op.func for op in stage.ops], dtype
+                    )
+                sample = np.zeros(1, dtype=dtype)
+                for op in stage.ops:
+                    sample = op.func(sample)
+                    stage.dtypes.append(sample.dtype)
+                dtype = sample.dtype
+            else:
+                shape = _get_shape(stage, shape)
+                if stage.to_float:
+                    dtype = np.dtype(np.float32)
+
+        with self._lock:
+            self._plans[key] = plan
+        return plan
+
+    def plan(
+        self,
+        shape: Tuple[int, int, int],
+        dtype=np.int16,
+        direction_zyx: Optional[np.ndarray] = None,
+    ) -> List[str]:
+        """ Get the names of the stages run on an image of the given shape,
+        dtype and direction.
+        """
+        plan = self._plan(tuple(shape), np.dtype(dtype), direction_zyx)
+        return [_get_name(stage) for stage in plan]
+
+    def _get_buffer(self, key, shape, dtype):
+        """ Get a buffer of the calling thread for a slot of a plan, only the
+        latest buffer of each slot is kept (memory does not grow with the
+        number of plans).
+        """
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(key)
+        if buffer is None or buffer.shape != tuple(shape) or \
+                buffer.dtype != dtype:
+            buffer = buffers[key] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def _run_fused(self, index, stage, src, reuse):
+        if stage.lut is not None:
+            out = None
+            if reuse:
+                out = self._get_buffer(
+                    (index,), src.shape, stage.lut.table.dtype
+                )
+            return stage.lut(src, out=out, num_threads=self.num_threads)
+
+        owned = False
+        for i, dtype in enumerate(stage.dtypes):
+            if owned and src.dtype == dtype:
+                out = src  # a buffer of this stage, transform it in-place
+            elif reuse:
+                out = self._get_buffer((index, i), src.shape, dtype)
+            else:
+                out = np.empty(src.shape, dtype=dtype)
+            src = stage.ops[i].apply(src, out, self.num_threads)
+            owned = True
+        return src
+
+    def run(
+        self,
+        img: Union[np.ndarray, Dict[str, Any]],
+        direction_zyx: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """ Run the pipeline on an image.
+
+        Args:
+            img: image, or a dict with "image_zyx" (and "direction_zyx")
+                returned by read_dicoms() / read_itk().
+            direction_zyx: direction of the image, used by reorient().
+
+        Returns:
+            the preprocessed image, a new contiguous array.
+        """
+        with _torch_num_threads(self.num_threads):
+            return self._run(img, direction_zyx)
+
+    __call__ = run
+
+    def _run(self, img, direction_zyx=None):
+        """ run() without setting the number of threads of torch."""
+        if isinstance(img, dict):
+            if direction_zyx is None:
+                direction_zyx = img.get("direction_zyx")
+            img = img["image_zyx"]
+
+        plan = self._plan(tuple(img.shape), img.dtype, direction_zyx)
+        # buffers can be reused until a later stage allocates the output
+        last = max([
+            i for i, stage in enumerate(plan) if not isinstance(stage, _View)
+        ], default=-1)
+
+        timings = []
+        dst = img
+        for i, stage in enumerate(plan):
+            tic = time.perf_counter()
+            if isinstance(stage, _View):
+                for op in stage.ops:
+                    dst = _apply_view(op, dst)
+            elif isinstance(stage, _Fused):
+                dst = self._run_fused(i, stage, dst, i < last)
+            else:
+                out = None
+                if i < last:
+                    out = self._get_buffer(
+                        (i,), stage.size,
+                        np.dtype(np.float32) if stage.to_float else dst.dtype
+                    )
+                dst = _resize(
+                    dst, stage.size, stage.to_float, stage.mode, out,
+                    self.num_threads
+                )
+            timings.append((_get_name(stage), time.perf_counter() - tic))
+
+        # views of img (e.g. a crop only plan) must not alias the input
+        if np.may_share_memory(dst, img) or not dst.flags.c_contiguous:
+            tic = time.perf_counter()
+            dst = np.array(dst)
+            timings.append(("copy", time.perf_counter() - tic))
+
+        with self._lock:
+            for name, seconds in timings:
+                self.timings[name] = self.timings.get(name, 0.) + seconds
+        return dst
+
+    def run_batch(
+        self,
+        imgs: Sequence[Union[np.ndarray, Dict[str, Any]]],
+        num_workers: int = 0,
+        executor: Optional[Executor] = None,
+    ) -> List[np.ndarray]:
+        """ Run the pipeline on many images.
+
+        Images of the same shape, dtype and orientation share one plan.
+
+        Args:
+            imgs: images, or dicts returned by read_dicoms() / read_itk().
+            num_workers: number of worker threads, 0 means running in the
+                calling thread.
+            executor: a concurrent.futures.Executor to run the pipeline
+                in. If given, num_workers is ignored.
+
+        Returns:
+            the preprocessed images in the same order.
+        """
+        # set once here, workers must not change the process-wide setting
+        with _torch_num_threads(self.num_threads):
+            if executor is not None:
+                return list(executor.map(self._run, imgs))
+            if num_workers <= 0:
+                return [self._run(img) for img in imgs]
+            with ThreadPoolExecutor(num_workers) as pool:
+                return list(pool.map(self._run, imgs))
+
+
+def _apply_view(op, img):
+    if isinstance(op, _Flip):
+        return flip(img, op.axes)
+    return crop(img, op.start, op.size)
+
+
+def _get_name(stage):
+    if isinstance(stage, _View):
+        return "view"
+    if isinstance(stage, _Fused):
+        return "+".join(op.name for op in stage.ops)
+    return "resize"
@@ -1,24 +1,108 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
 from functools import partial
 import math
 import os
 from pathlib import Path
-from typing import Any, Dict, List, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 import numpy as np
 import pydicom
+from pydicom.filereader import read_partial
+from pydicom.tag import Tag
 import SimpleITK
 import umtk.error_handling as exc
+from umtk.utils.lazy_dict import LazyDict
+from .dicom_index import DicomIndex
+from .io import get_array_view
+
+
+# Tags needed to sort, validate and decode a series, see _get_series_id,
+# _sort_headers, _get_instance_numbers, _get_pixel_spacing, _get_origin,
+# _get_direction and _read_pixels.
+HEADER_TAGS = [
+    Tag("SeriesInstanceUID"),
+    Tag("InstanceNumber"),
+    Tag("ImagePositionPatient"),
+    Tag("ImageOrientationPatient"),
+    Tag("Rows"),
+    Tag("Columns"),
+    Tag("PixelSpacing"),
+    Tag("BitsStored"),
+    Tag("PixelRepresentation"),
+    Tag("RescaleIntercept"),
+    Tag("RescaleSlope"),
+]
+_LAST_HEADER_TAG = max(HEADER_TAGS)
+
+
+def _after_last_header_tag(tag, vr, length) -> bool:
+    return tag > _LAST_HEADER_TAG
+
+
+def _map(
+    func: Callable[[Any], Any],
+    args: List[Any],
+    num_workers: int = 0,
+    executor: Optional[Executor] = None,
+) -> List[Any]:
+    """ Map func over args on an executor / a thread pool, keeping order."""
+    if executor is not None:
+        return list(executor.map(func, args, chunksize=16))
+    if num_workers > 0:
+        with ThreadPoolExecutor(num_workers) as pool:
+            return list(pool.map(func, args))
+    return [func(arg) for arg in args]
+
+
+def _read_dicom_header(
+    path: Union[str, Path],
+    fast: bool = False,
+    stop_before_pixels: bool = True,
+):
+    """ Read one dicom header, return None on failure.
+
+    Failures are reported by value rather than raised so that headers read
+    on a pool can be checked in input order by the caller.
+
+    In fast mode only HEADER_TAGS are parsed: other elements are skipped
+    over without decoding and reading stops right after the last needed
+    tag, so large private blocks (e.g. Siemens CSA headers) and pixel data
+    are never touched.
+    """
+    try:
+        if not fast or not stop_before_pixels:
+            return pydicom.dcmread(
+                path, stop_before_pixels=stop_before_pixels, force=True
+            )
+        with open(path, "rb") as f:
+            return read_partial(
+                f,
+                stop_when=_after_last_header_tag,
+                force=True,
+                specific_tags=HEADER_TAGS
+            )
+    except Exception:
+        return None
 
 
 def _read_dicom_headers(
-        paths: List[Union[str, Path]]
+        paths: List[Union[str, Path]],
+        num_workers: int = 0,
+        executor: Optional[Executor] = None,
+        fast_header: bool = False,
+        stop_before_pixels: bool = True,
 ) -> List[pydicom.dataset.FileDataset]:
+    read = partial(
+        _read_dicom_header,
+        fast=fast_header,
+        stop_before_pixels=stop_before_pixels
+    )
+    results = _map(read, paths, num_workers, executor)
+
+    # results come back in input order, so the first failing path reported
+    # here does not depend on the scheduling of the pool
     headers = []
-
-    read = partial(pydicom.dcmread, stop_before_pixels=True, force=True)
-    for path in paths:
-        try:
-            header = read(path)
-        except Exception as e:
+    for path, header in zip(paths, results):
+        if header is None:
             raise exc.ReadDicomHeaderError(
                 "Failed to read dicom header [{}]".format(path)
             )
@@ -156,40 +240,134 @@ def _get_direction(
     return np.array([1, y, x])
 
 
-def read_dicoms(
-    paths: Union[List[Union[str, Path]], str, Path],
-    min_num_slices: int = 20,
-    allow_missing_layers: bool = False
-) -> Dict[str, Any]:
-    """ Read an itk format image.
+def _get_direction_cosines(
+    headers: List[pydicom.dataset.FileDataset]
+) -> np.ndarray:
+    """ Get the row-major xyz direction matrix used by itk."""
+    try:
+        d = [float(v) for v in headers[0].ImageOrientationPatient]
+        row, col = np.array(d[:3]), np.array(d[3:])
+    except Exception as e:
+        row, col = np.array([1., 0., 0.]), np.array([0., 1., 0.])
 
-    Args:
-        paths: dicom file path list or directory containing dicoms.
-        min_num_slices: minimum number of instances allowed.
-        allow_missing_layers: whether to allow input containing
-            missing layers.
+    return np.stack([row, col, np.cross(row, col)], axis=1)
 
-    Returns:
-        dict containing volume data and dicom tags.
 
-    N.B.
-        Mandatory tags:
-            - SeriesInstanceUid
-            - InstanceNumber
-            - ImagePosition
-            - PixelSpacing
-        Optional tags:
-            - ImageOrientation [Default=(1, 1, 1)]
+def _get_rescale(header: pydicom.dataset.FileDataset):
+    slope = float(getattr(header, "RescaleSlope", 1.0))
+    intercept = float(getattr(header, "RescaleIntercept", 0.0))
+    return slope, intercept
 
-        Caller should take care of dicom validation (whether is valid dicom).
+
+def _get_rescaled_dtype(headers: List[pydicom.dataset.FileDataset]):
+    """ Get the smallest dtype holding rescaled values of all slices."""
+    rescales = [_get_rescale(header) for header in headers]
+    if any(s != 1.0 or not i.is_integer() for s, i in rescales):
+        return np.dtype(np.float32)
+
+    bits = int(headers[0].BitsStored)
+    if int(headers[0].PixelRepresentation) == 1:
+        low, high = -2 ** (bits - 1), 2 ** (bits - 1) - 1
+    else:
+        low, high = 0, 2 ** bits - 1
+    intercepts = [i for _, i in rescales]
+    low, high = low + min(intercepts), high + max(intercepts)
+    # keep unsigned stored values unsigned (as itk does) if they stay >= 0
+    dtypes = (np.int16, np.int32)
+    if low >= 0:
+        dtypes = (np.uint8, np.uint16) + dtypes
+    for dtype in dtypes:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.float32)
+
+
+def _read_pixels(
+    headers: List[pydicom.dataset.FileDataset],
+    dtype: Optional[np.dtype] = None,
+) -> np.ndarray:
+    """ Decode pixels of sorted headers into one (Z, Y, X) array.
+
+    Headers read with their pixel data are decoded directly, other files
+    are opened once more to get their pixels. Each slice is rescaled in
+    place in the output array and its raw pixel data is released right
+    after decoding.
+
+    dtype defaults to the smallest type holding rescaled values of the given
+    slices.
     """
-    assert isinstance(paths, (list, tuple, str, Path))
+    if dtype is None:
+        dtype = _get_rescaled_dtype(headers)
+    shape = (len(headers), int(headers[0].Rows), int(headers[0].Columns))
+    img = np.empty(shape, dtype=dtype)
+
+    for dst, header in zip(img, headers):
+        slope, intercept = _get_rescale(header)
+        ds = header
+        if not hasattr(ds, "PixelData"):
+            ds = pydicom.dcmread(header.filename, force=True)
+        np.copyto(dst, ds.pixel_array, casting="unsafe")
+        if slope != 1.0:
+            dst *= slope
+        if intercept != 0.0:
+            dst += intercept if img.dtype.kind == "f" else int(intercept)
+        del ds.PixelData
+
+    return img
+
+
+def _to_itk_image(
+    img_zyx: np.ndarray,
+    spacing_zyx: np.ndarray,
+    origin_zyx: np.ndarray,
+    direction_xyz: np.ndarray,
+) -> SimpleITK.Image:
+    img_itk = SimpleITK.GetImageFromArray(img_zyx)
+    img_itk.SetSpacing([float(x) for x in spacing_zyx[::-1]])
+    img_itk.SetOrigin([float(x) for x in origin_zyx[::-1]])
+    img_itk.SetDirection([float(x) for x in direction_xyz.ravel()])
+    return img_itk
+
+
+def _get_headers(
+    paths: Union[List[Union[str, Path]], str, Path],
+    num_workers: int,
+    executor: Optional[Executor],
+    fast_header: bool,
+    stop_before_pixels: bool,
+    index: Optional[DicomIndex],
+) -> List[Any]:
+    """ Get the headers of a series given its files or directory."""
     if isinstance(paths, (str, Path)) and os.path.isdir(paths):
-        paths = SimpleITK.ImageSeriesReader.GetGDCMSeriesFileNames(paths)
+        if index is not None:
+            paths = index.get_series_files(paths)
+        else:
+            paths = SimpleITK.ImageSeriesReader.GetGDCMSeriesFileNames(
+                str(paths)
+            )
     assert len(paths) != 0
 
     # read dicom headers
-    headers = _read_dicom_headers(paths)
+    if index is not None:
+        return index.read_headers(paths, partial(
+            _read_dicom_headers, num_workers=num_workers, executor=executor,
+            fast_header=True
+        ))
+    return _read_dicom_headers(
+        paths, num_workers, executor, fast_header, stop_before_pixels
+    )
+
+
+def _validate_series(
+    headers: List[pydicom.dataset.FileDataset],
+    min_num_slices: int,
+    allow_missing_layers: bool,
+):
+    """ Sort and validate a series given its parsed headers.
+
+    Returns:
+        series id, instance numbers, spacing, origin and direction.
+    """
     series_id = _get_series_id(headers)  # make sure dicom has series id
     _sort_headers(headers)
     instance_numbers = _get_instance_numbers(headers, allow_missing_layers)
@@ -199,30 +377,210 @@ def read_dicoms(
     direction_zyx = _get_direction(headers)
 
     # validation
-    if len(paths) < min_num_slices:
+    if len(headers) < min_num_slices:
         raise exc.NotEnoughSlicesError(
             "Not enough slices, SeriesId={}, Num-slices=[{}]".
-                format(series_id, len(paths))
+                format(series_id, len(headers))
         )
 
+    return series_id, instance_numbers, spacing_zyx, origin_zyx, direction_zyx
+
+
+def _read_series(
+    headers: List[pydicom.dataset.FileDataset],
+    min_num_slices: int,
+    allow_missing_layers: bool,
+    backend: str,
+    zero_copy: bool = False,
+    keep_itk: bool = True,
+    load_image: bool = True,
+) -> Dict[str, Any]:
+    """ Validate a series given its parsed headers and load its volume."""
+    series_id, instance_numbers, spacing_zyx, origin_zyx, direction_zyx = \
+        _validate_series(headers, min_num_slices, allow_missing_layers)
+
+    vtd = LazyDict({
+        "series_id": series_id,
+        "instances": instance_numbers,
+        "sorted_paths": [header.filename for header in headers],
+    })
+    if not load_image:
+        vtd["shape_zyx"] = (
+            len(headers), int(headers[0].Rows), int(headers[0].Columns)
+        )
+        vtd.update({
+            "spacing_zyx": spacing_zyx,
+            "direction_zyx": direction_zyx,
+            "origin_zyx": origin_zyx,
+        })
+        return vtd
+
     # load image data
+    img_itk = None
     try:
-        img_itk = SimpleITK.ReadImage([header.filename for header in headers])
-        img_zyx = SimpleITK.GetArrayFromImage(img_itk)
+        if backend == "itk":
+            img_itk = SimpleITK.ReadImage(
+                [header.filename for header in headers]
+            )
+            if zero_copy:
+                img_zyx = get_array_view(img_itk)
+            else:
+                img_zyx = SimpleITK.GetArrayFromImage(img_itk)
+        else:
+            img_zyx = _read_pixels(headers)
     except Exception as e:
         raise exc.ReadDicomDataError(
             "Failed to read dicom data, SeriesId=[{}]".format(series_id)
         )
 
-    return {
-        "series_id": series_id,
-        "instances": instance_numbers,
-        "sorted_paths": [header.filename for header in headers],
-
-        "image_itk": img_itk,
+    vtd.update({
+        "image_itk": img_itk if keep_itk else None,
         "image_zyx": img_zyx,
 
         "spacing_zyx": spacing_zyx,
         "direction_zyx": direction_zyx,
         "origin_zyx": origin_zyx,
-    }
+    })
+    if img_itk is None and keep_itk:
+        vtd.set_lazy("image_itk", partial(
+            _to_itk_image, img_zyx, spacing_zyx, origin_zyx,
+            _get_direction_cosines(headers)
+        ))
+    return vtd
+
+
+def read_dicoms(
+    paths: Union[List[Union[str, Path]], str, Path],
+    min_num_slices: int = 20,
+    allow_missing_layers: bool = False,
+    num_workers: int = 0,
+    executor: Optional[Executor] = None,
+    fast_header: bool = False,
+    backend: str = "itk",
+    index: Optional[Union[str, Path, DicomIndex]] = None,
+    zero_copy: bool = False,
+    keep_itk: bool = True,
+    load_image: bool = True,
+) -> Dict[str, Any]:
+    """ Read an itk format image.
+
+    Args:
+        paths: dicom file path list or directory containing dicoms.
+        min_num_slices: minimum number of instances allowed.
+        allow_missing_layers: whether to allow input containing
+            missing layers.
+        num_workers: number of threads used to parse dicom headers,
+            0 means parsing in the calling thread. Threads pay off when
+            reading is I/O bound, e.g. series stored on NFS.
+        executor: an existing thread / process pool used to parse dicom
+            headers, takes precedence over num_workers. Use a process pool
+            when parsing is CPU bound.
+        fast_header: whether to parse only the tags needed to sort and
+            validate the series instead of the full header. Ignored by
+            the "pydicom" backend, which reads every file in full.
+        backend: pixel decoding backend, support "itk" and "pydicom".
+            "itk" hands the sorted files to SimpleITK, which opens and parses
+            them a second time. "pydicom" opens each file only once and
+            decodes its pixels straight into one preallocated volume,
+            "image_itk" is then built lazily on first access.
+        index: a DicomIndex or the path of its database. Header fields
+            (and the series file list of a directory) are then taken from
+            the index, only new or modified files are parsed.
+        zero_copy: whether "image_zyx" should share the pixel buffer of the
+            itk image instead of being a copy of it ("itk" backend only).
+        keep_itk: whether to keep the itk image as "image_itk", otherwise
+            "image_itk" is None.
+        load_image: whether to read pixels. If False only headers are read
+            and the dict has "shape_zyx" instead of "image_itk" and
+            "image_zyx".
+
+    Returns:
+        dict containing volume data and dicom tags.
+
+    N.B.
+        Mandatory tags:
+            - SeriesInstanceUid
+            - InstanceNumber
+            - ImagePosition
+            - PixelSpacing
+        Optional tags:
+            - ImageOrientation [Default=(1, 1, 1)]
+
+        Caller should take care of dicom validation (whether is valid dicom).
+    """
+    assert isinstance(paths, (list, tuple, str, Path))
+    assert backend in ("itk", "pydicom")
+    if isinstance(index, (str, Path)):
+        with DicomIndex(index) as index:
+            return read_dicoms(
+                paths, min_num_slices, allow_missing_layers, num_workers,
+                executor, fast_header, backend, index, zero_copy, keep_itk,
+                load_image
+            )
+
+    headers = _get_headers(
+        paths, num_workers, executor, fast_header,
+        backend != "pydicom" or not load_image, index
+    )
+    return _read_series(
+        headers, min_num_slices, allow_missing_layers, backend,
+        zero_copy, keep_itk, load_image
+    )
+
+
+# Benchmark of header parsing against the number of slices, the size of
+# the worker pool and the header mode (on headers bloated with vendor
+# private tags).
+if __name__ == "__main__":
+    from concurrent.futures import ProcessPoolExecutor
+    import shutil
+    import sys
+    import tempfile
+    import time
+
+    def add_private_tags(ds):
+        block = ds.private_block(0x0019, "UMTK_BENCH_01", create=True)
+        block.add_new(0x10, "OB", bytes(256 * 1024))
+        items = []
+        for i in range(500):
+            item = pydicom.Dataset()
+            item.add_new(0x00291010, "LO", "item-{}".format(i))
+            item.add_new(0x00291020, "OB", bytes(1024))
+            items.append(item)
+        block = ds.private_block(0x0029, "UMTK_BENCH_02", create=True)
+        block.add_new(0x10, "SQ", pydicom.Sequence(items))
+
+    def make_series(src_path, dst_dir, num_slices, bloat=False):
+        ds = pydicom.dcmread(src_path)
+        if bloat:
+            add_private_tags(ds)
+        for i in range(num_slices):
+            ds.InstanceNumber = i + 1
+            ds.ImagePositionPatient = [0.0, 0.0, float(i)]
+            ds.save_as(os.path.join(dst_dir, "{:04d}.dcm".format(i)))
+        return sorted(
+            os.path.join(dst_dir, x) for x in os.listdir(dst_dir)
+        )
+
+    def bench(description, *args, **kwargs):
+        t_start = time.time()
+        _read_dicom_headers(*args, **kwargs)
+        print("{}: {:.3f}s".format(description, time.time() - t_start))
+
+    src_path = sys.argv[1]
+    for num_slices in (100, 400, 1600):
+        tmp_dir = tempfile.mkdtemp()
+        paths = make_series(src_path, tmp_dir, num_slices)
+        for num_workers in (0, 4, 16):
+            bench("slices={:5d} threads={:2d}".format(
+                num_slices, num_workers), paths, num_workers=num_workers)
+        with ProcessPoolExecutor(4) as pool:
+            bench("slices={:5d} processes=4".format(num_slices),
+                  paths, executor=pool)
+        shutil.rmtree(tmp_dir)
+
+    tmp_dir = tempfile.mkdtemp()
+    paths = make_series(src_path, tmp_dir, 400, bloat=True)
+    bench("bloated slices=400 full header", paths)
+    bench("bloated slices=400 fast header", paths, fast_header=True)
+    shutil.rmtree(tmp_dir)
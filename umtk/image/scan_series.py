@@ -0,0 +1,169 @@
+from concurrent.futures import Executor
+from functools import partial
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import pydicom
+import umtk.error_handling as exc
+from .dicom_index import DicomIndex
+from .read_dicoms import (
+    _get_direction,
+    _get_instance_numbers,
+    _get_origin,
+    _get_pixel_spacing,
+    _map,
+    _read_dicom_header,
+    _read_series,
+    _sort_headers,
+)
+
+
+class DicomSeries:
+    """ A dicom series found by scan_series().
+
+    Holds the sorted headers and geometry of the series, pixels are only
+    read when load() is called.
+
+    Attributes:
+        series_id: SeriesInstanceUID of the series.
+        sorted_paths: dicom file paths sorted by image position.
+        spacing_zyx, origin_zyx, direction_zyx: same as read_dicoms(),
+            None if they can not be computed (see error).
+        error: the umtk.BaseError raised while sorting the series or
+            computing its geometry, None if the series is valid.
+    """
+    def __init__(self, series_id: str, headers: List[Any]):
+        self.series_id = series_id
+        self.headers = headers
+        self.spacing_zyx = None
+        self.origin_zyx = None
+        self.direction_zyx = None
+        self.error = None
+
+        try:
+            _sort_headers(self.headers)
+            _get_instance_numbers(self.headers, allow_missing_slices=True)
+            if len(self.headers) > 1:
+                self.spacing_zyx = _get_pixel_spacing(
+                    self.headers, allow_missing_slices=True
+                )
+            self.origin_zyx = _get_origin(self.headers)
+            self.direction_zyx = _get_direction(self.headers)
+        except exc.BaseError as e:
+            self.error = e
+
+    def __len__(self):
+        return len(self.headers)
+
+    def __repr__(self):
+        return "DicomSeries({!r}, num-slices={})".format(
+            self.series_id, len(self)
+        )
+
+    @property
+    def sorted_paths(self) -> List[str]:
+        return [header.filename for header in self.headers]
+
+    def load(
+        self,
+        min_num_slices: int = 20,
+        allow_missing_layers: bool = False,
+        backend: str = "itk",
+        zero_copy: bool = False,
+        keep_itk: bool = True,
+        load_image: bool = True,
+    ) -> Dict[str, Any]:
+        """ Load the series, see read_dicoms() for arguments and result.
+
+        Headers parsed by scan_series() are reused, only pixels are read.
+        """
+        if self.error is not None:
+            raise self.error
+        assert backend in ("itk", "pydicom")
+        return _read_series(
+            list(self.headers), min_num_slices, allow_missing_layers, backend,
+            zero_copy, keep_itk, load_image
+        )
+
+
+def _scandir(directory: str) -> Tuple[List[str], List[str]]:
+    files, dirs = [], []
+    for entry in os.scandir(directory):
+        if entry.is_dir():
+            dirs.append(entry.path)
+        elif entry.is_file():
+            files.append(entry.path)
+    return sorted(files), sorted(dirs)
+
+
+def _list_files(
+    root: str,
+    num_workers: int,
+    executor: Optional[Executor],
+) -> List[str]:
+    """ List files under root, scanning each tree level in parallel."""
+    files, dirs = [], [root]
+    while len(dirs) != 0:
+        results = _map(_scandir, dirs, num_workers, executor)
+        dirs = []
+        for sub_files, sub_dirs in results:
+            files.extend(sub_files)
+            dirs.extend(sub_dirs)
+    return files
+
+
+def _read_headers(
+    paths: List[str],
+    num_workers: int,
+    executor: Optional[Executor],
+) -> List[pydicom.dataset.Dataset]:
+    """ Read fast headers, files which are not dicom get an empty header."""
+    headers = _map(
+        partial(_read_dicom_header, fast=True), paths, num_workers, executor
+    )
+    return [
+        pydicom.Dataset() if header is None else header for header in headers
+    ]
+
+
+def scan_series(
+    root: Union[str, Path],
+    num_workers: int = 0,
+    executor: Optional[Executor] = None,
+    index: Optional[DicomIndex] = None,
+) -> Iterator[DicomSeries]:
+    """ Find all dicom series under a directory tree.
+
+    Every file is parsed once (in fast header mode) and grouped by
+    SeriesInstanceUID. Files which are not dicom or have no series uid
+    are skipped.
+
+    Args:
+        root: directory to scan recursively.
+        num_workers: number of threads used to list directories and parse
+            headers, 0 means running in the calling thread.
+        executor: an existing thread / process pool, takes precedence over
+            num_workers.
+        index: a DicomIndex caching the parsed headers.
+
+    Returns:
+        an iterator of series in the order they were first found.
+
+    Example:
+    >>> import umtk
+    >>> for series in umtk.scan_series("study_dir", num_workers=8):
+    >>>     if series.error is None:
+    >>>         vtd = series.load()
+    """
+    paths = _list_files(str(root), num_workers, executor)
+    read = partial(_read_headers, num_workers=num_workers, executor=executor)
+    headers = read(paths) if index is None else index.read_headers(paths, read)
+
+    groups = {}
+    for header in headers:
+        series_id = getattr(header, "SeriesInstanceUID", None)
+        if series_id is not None:
+            groups.setdefault(str(series_id), []).append(header)
+
+    for series_id, series_headers in groups.items():
+        yield DicomSeries(series_id, series_headers)
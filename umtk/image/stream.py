@@ -0,0 +1,121 @@
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+import numpy as np
+import SimpleITK
+import umtk.error_handling as exc
+from .dicom_index import DicomIndex
+from .read_dicoms import (
+    _get_headers,
+    _get_rescaled_dtype,
+    _read_pixels,
+    _validate_series,
+)
+
+
+def _iter_dicom_slabs(headers, slab_size, dtype):
+    for start in range(0, len(headers), slab_size):
+        stop = min(start + slab_size, len(headers))
+        try:
+            slab = _read_pixels(headers[start:stop], dtype)
+        except Exception as e:
+            raise exc.ReadDicomDataError(
+                "Failed to read dicom data [{}]".format(
+                    headers[start].filename
+                )
+            ) from e
+        yield start, slab
+
+
+def iter_dicom_slabs(
+    paths: Union[List[Union[str, Path]], str, Path],
+    slab_size: int = 1,
+    min_num_slices: int = 20,
+    allow_missing_layers: bool = False,
+    num_workers: int = 0,
+    executor: Optional[Executor] = None,
+    index: Optional[DicomIndex] = None,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """ Read a dicom series slab by slab.
+
+    The series is validated like read_dicoms() when this function is
+    called, then only one slab is held in memory at a time.
+
+    Args:
+        paths: dicom file path list or directory containing dicoms.
+        slab_size: number of slices per slab (the last slab may be thinner).
+        min_num_slices, allow_missing_layers, num_workers, executor, index:
+            see read_dicoms().
+
+    Returns:
+        an iterator of (z-index of the first slice, slab of shape (N, Y, X))
+        in sorted order. Slabs are rescaled and share one dtype.
+
+    Example:
+    >>> import umtk
+    >>> for z, slab in umtk.iter_dicom_slabs("series_dir", slab_size=32):
+    >>>     pred[z:z + len(slab)] = model(slab)
+    """
+    assert slab_size > 0
+    headers = _get_headers(
+        paths, num_workers, executor, True, True, index
+    )
+    _validate_series(headers, min_num_slices, allow_missing_layers)
+    return _iter_dicom_slabs(
+        headers, slab_size, _get_rescaled_dtype(headers)
+    )
+
+
+def _iter_itk_slabs(reader, path, slab_size):
+    size = list(reader.GetSize())
+    num_slices = size[2]
+    for start in range(0, num_slices, slab_size):
+        size[2] = min(slab_size, num_slices - start)
+        reader.SetExtractIndex([0, 0, start])
+        reader.SetExtractSize(size)
+        try:
+            slab = SimpleITK.GetArrayFromImage(reader.Execute())
+        except Exception as e:
+            raise exc.ReadDicomDataError(
+                "Failed to read dicom data, file path=[{}]".format(path)
+            ) from e
+        yield start, slab
+
+
+def iter_itk_slabs(
+    path: Union[str, Path],
+    slab_size: int = 1,
+    min_num_slices: int = 1,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """ Read an itk format image slab by slab.
+
+    Formats which support streaming (e.g. mha, nrrd) only read the
+    requested slices from disk.
+
+    Args:
+        path: itk image file path.
+        slab_size: number of slices per slab (the last slab may be thinner).
+        min_num_slices: minimum number of slices allowed.
+
+    Returns:
+        an iterator of (z-index of the first slice, slab of shape (N, Y, X)).
+    """
+    assert slab_size > 0
+    reader = SimpleITK.ImageFileReader()
+    reader.SetFileName(str(path))
+    try:
+        reader.ReadImageInformation()
+    except Exception as e:
+        raise exc.ReadDicomDataError(
+            "Failed to read dicom data, file path=[{}]".format(path)
+        ) from e
+
+    num_slices = reader.GetSize()[2] if reader.GetDimension() == 3 else 1
+    if reader.GetDimension() != 3 or num_slices < min_num_slices:
+        raise exc.NotEnoughSlicesError(
+            "Not enough slices, file path=[{}], Num-slices=[{}]".format(
+                path, num_slices
+            )
+        )
+
+    return _iter_itk_slabs(reader, path, slab_size)
@@ -27,8 +27,9 @@ def isdicom(path: Union[str, Path]) -> bool:
     return False if header[128:132] != b"DICM" else True
 
 
-def get_reorient_image(vtd: Dict[str, Any]) -> np.ndarray:
-    return np.flip(
-        vtd["image_zyx"],
-        np.where(vtd["direction_zyx"] < 0)[0]
-    )
+def get_reorient_image(
+    vtd: Dict[str, Any],
+    copy: bool = False
+) -> np.ndarray:
+    from .geometry import reorient  # torch is only needed here
+    return reorient(vtd["image_zyx"], vtd["direction_zyx"], copy=copy)
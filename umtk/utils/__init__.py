@@ -1,13 +1,21 @@
 # flake8: noqa
 
-from .encryption import (
-    encrypt,
-    decrypt,
-    decrypt_to_file_object
-)
-from .ftp import FTP
-from .md5 import compute_md5_str
-from .multiprocess import tqdm_imap_unordered
-from .timer import Timer
+from umtk._lazy import attach
 
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    ".backend": ["get_array_module", "has_cupy", "is_cupy_array"],
+    ".encryption": ["encrypt", "decrypt", "decrypt_to_file_object"],
+    ".ftp": ["FTP"],
+    ".lazy_dict": ["LazyDict"],
+    ".md5": ["compute_md5_str"],
+    ".multiprocess": ["run_in_slabs", "tqdm_imap_unordered"],
+    ".timer": ["Timer"],
+}, submodules=[
+    "backend",
+    "encryption",
+    "ftp",
+    "lazy_dict",
+    "md5",
+    "multiprocess",
+    "timer",
+])
@@ -0,0 +1,37 @@
+import importlib
+import importlib.util
+from types import ModuleType
+from typing import Any
+import numpy as np
+
+
+def has_cupy() -> bool:
+    """ Whether cupy is installed (without importing it)."""
+    return importlib.util.find_spec("cupy") is not None
+
+
+def import_cupy() -> ModuleType:
+    """ Import cupy on first use.
+
+    Raises:
+        ImportError: cupy is not installed.
+    """
+    try:
+        return importlib.import_module("cupy")
+    except ImportError as e:
+        raise ImportError(
+            "cupy is required for GPU arrays, "
+            "install the cupy package matching your CUDA version"
+        ) from e
+
+
+def is_cupy_array(arr: Any) -> bool:
+    """ Whether arr is a cupy array, cupy is not imported to check it."""
+    return type(arr).__module__.split(".")[0] == "cupy"
+
+
+def get_array_module(arr: Any) -> ModuleType:
+    """ Get the array module (numpy or cupy) of an array, like
+    cupy.get_array_module() but usable without cupy.
+    """
+    return import_cupy() if is_cupy_array(arr) else np
@@ -0,0 +1,93 @@
+from collections.abc import ItemsView, ValuesView
+from typing import Any, Callable, Hashable
+
+
+class LazyDict(dict):
+    """ A dict whose values can be computed on first access.
+
+    A lazy key is listed by keys() and `in` like any other key, its factory
+    is called the first time the value is accessed and the result replaces
+    it. values() and items() are views loading values one by one while
+    iterated.
+
+    Example:
+    >>> d = LazyDict(a=1)
+    >>> d.set_lazy("b", lambda: 2)
+    >>> "b" in d, d.is_loaded("b")
+    (True, False)
+    >>> d["b"]
+    2
+
+    N.B.
+        dict(d) and other C level copies see None for values that have not
+        been loaded yet, use d.copy() to keep them lazy.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._factories = {}
+
+    def set_lazy(self, key: Hashable, factory: Callable[[], Any]) -> None:
+        """ Set a value computed by calling factory() on first access."""
+        super().__setitem__(key, None)
+        self._factories[key] = factory
+
+    def is_loaded(self, key: Hashable) -> bool:
+        return key not in self._factories
+
+    def _load(self, key):
+        factory = self._factories.get(key)
+        if factory is not None:
+            super().__setitem__(key, factory())
+            del self._factories[key]
+
+    def __getitem__(self, key):
+        self._load(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self._factories.pop(key, None)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._factories.pop(key, None)
+        super().__delitem__(key)
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join(
+            "{!r}: {}".format(
+                k, "<lazy>" if k in self._factories else repr(v)
+            ) for k, v in super().items()
+        ))
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def pop(self, key, *args):
+        if key in self:
+            self._load(key)
+        return super().pop(key, *args)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, other=(), **kwargs):
+        if hasattr(other, "keys"):
+            other = [(key, other[key]) for key in other.keys()]
+        for key, value in list(other) + list(kwargs.items()):
+            self[key] = value
+
+    def values(self):
+        return ValuesView(self)
+
+    def items(self):
+        return ItemsView(self)
+
+    def __reduce__(self):
+        return type(self), (dict(super().items()),), self.__dict__
+
+    def copy(self):
+        d = type(self)(super().items())
+        d._factories = dict(self._factories)
+        return d
@@ -1,4 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
 import multiprocessing
+import os
 from typing import Any, Callable, List, Optional
 from tqdm import tqdm
 
@@ -37,6 +39,42 @@ def tqdm_imap_unordered(
     return result
 
 
+def run_in_slabs(
+    func: Callable[[int, int], Any],
+    length: int,
+    num_threads: Optional[int] = None,
+) -> List[Any]:
+    """ Run a function over contiguous slabs of a range on a thread pool.
+
+    Typically used to process a volume slab by slab along the z axis with
+    numpy / scipy / torch calls which release the GIL.
+
+    Args:
+        func: the function to be called as func(start, stop) for each slab.
+        length: length of the range split into slabs, e.g. depth of a
+            volume.
+        num_threads: number of threads (and slabs) to be utilized.
+            If None, use all available cores. 1 runs func(0, length) in the
+            calling thread.
+
+    Return:
+        the results of all slabs in order.
+    """
+    if num_threads is None:
+        num_threads = os.cpu_count()
+    num_threads = max(1, min(num_threads, length))
+    if num_threads == 1:
+        return [func(0, length)]
+
+    bounds = [length * i // num_threads for i in range(num_threads + 1)]
+    with ThreadPoolExecutor(num_threads) as pool:
+        futures = [
+            pool.submit(func, start, stop)
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        return [future.result() for future in futures]
+
+
 # Multiprocessing cannot be tested in pytest.
 # We can test it here instead.
 if __name__ == "__main__":
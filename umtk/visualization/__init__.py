@@ -1,5 +1,7 @@
 # flake8: noqa
 
-from .image import (show_mpr)
+from umtk._lazy import attach
 
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    ".image": ["show_mpr"],
+}, submodules=["image"])
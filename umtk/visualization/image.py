@@ -10,5 +10,5 @@ def show_mpr(img: np.ndarray) -> None:
         Image should be re-oriented before calling this function.
         Refer to read_itk on how to standardize image orientation.
     """
-    img_trans = umtk.zflip(umtk.yflip(np.swapaxes(img, 0, 2)))
+    img_trans = umtk.reorient(img, (1, -1, -1), axes=(2, 1, 0))
     OrthoSlicer3D(img_trans).show()